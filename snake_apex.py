@@ -0,0 +1,386 @@
+import argparse
+import collections
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch as th
+from stable_baselines3 import DQN
+from stable_baselines3.common.logger import configure
+from stable_baselines3.common.utils import polyak_update
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from snake_gameRL1 import OBSERVATION_MODES
+from snake_prioritized_replay import PrioritizedDQN
+from snake_train_dqn import make_env
+
+# Exploration of actor env i out of N (Ape-X): EPSILON_BASE ** (1 + EPSILON_ALPHA * i / (N - 1)),
+# so a few envs explore a lot and most act almost greedily.
+EPSILON_BASE = 0.4
+EPSILON_ALPHA = 7.0
+ACTOR_JOIN_TIMEOUT = 5.0  # Seconds an actor gets to stop before it is terminated.
+
+
+def actor_epsilons(n):
+    """The fixed exploration rates of n actor envs."""
+    if n == 1:
+        return np.array([EPSILON_BASE])
+    return EPSILON_BASE ** (1 + EPSILON_ALPHA * np.arange(n) / float(n - 1))
+
+
+# --- Shared-memory transition ring ---
+class TransitionRing:
+    """
+    Single-producer, single-consumer ring of vectorized steps in a
+    multiprocessing.shared_memory block.
+
+    Every row holds one step of an actor's n_envs envs (obs, next_obs, action,
+    reward, done, truncated). The actor writes the row in place and then
+    publishes it by bumping the `written` counter at the start of the block;
+    the learner copies out the rows between its own read position and
+    `written`. Nothing blocks: if the learner falls `capacity` rows or more
+    behind, the oldest rows are overwritten and counted as dropped.
+    """
+
+    def __init__(self, capacity, n_envs, obs_shape, obs_dtype, name=None):
+        self.capacity = capacity
+        self.n_envs = n_envs
+        self.obs_shape = tuple(obs_shape)
+        self.obs_dtype = np.dtype(obs_dtype)
+        self.row_dtype = np.dtype([
+            ("obs", self.obs_dtype, (n_envs,) + self.obs_shape),
+            ("next_obs", self.obs_dtype, (n_envs,) + self.obs_shape),
+            ("action", np.uint8, (n_envs,)),
+            ("reward", np.float32, (n_envs,)),
+            ("done", np.bool_, (n_envs,)),
+            ("truncated", np.bool_, (n_envs,)),
+        ])
+        size = 8 + capacity * self.row_dtype.itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.written = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.rows = np.ndarray((capacity,), dtype=self.row_dtype, buffer=self.shm.buf, offset=8)
+        self.read = 0
+        self.dropped = 0
+
+    def __reduce__(self):
+        # Processes started with spawn attach to the same block by name.
+        return (TransitionRing, (self.capacity, self.n_envs, self.obs_shape, self.obs_dtype, self.shm.name))
+
+    def push(self, obs, next_obs, action, reward, done, truncated):
+        """Write one step (actor side)."""
+        index = int(self.written[0])
+        row = index % self.capacity
+        self.rows["obs"][row] = obs
+        self.rows["next_obs"][row] = next_obs
+        self.rows["action"][row] = action
+        self.rows["reward"][row] = reward
+        self.rows["done"][row] = done
+        self.rows["truncated"][row] = truncated
+        self.written[0] = index + 1
+
+    def pop_all(self):
+        """Return a copy of the rows written since the last call (learner side)."""
+        written = int(self.written[0])
+        # Slot written % capacity may be half-written by the actor right now, so at
+        # most capacity - 1 rows are safe to copy.
+        start = max(self.read, written - self.capacity + 1)
+        self.dropped += start - self.read
+        rows = self.rows[np.arange(start, written) % self.capacity]
+        # Rows the actor lapped (or started overwriting) while they were being copied are incomplete.
+        lapped = max(int(self.written[0]) + 1 - self.capacity - start, 0)
+        self.dropped += min(lapped, len(rows))
+        self.read = written
+        return rows[lapped:]
+
+    def close(self, unlink=False):
+        del self.written, self.rows
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# --- Shared-memory weight broadcast ---
+class SharedWeights:
+    """
+    The Q-network parameters as one float32 vector in shared memory, with a
+    version counter used as a seqlock: the learner makes it odd while it
+    writes and even again afterwards, and a reader keeps its copy only if the
+    version was the same even number before and after copying.
+    """
+
+    def __init__(self, n_params, name=None):
+        self.n_params = n_params
+        size = 8 + 4 * n_params
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.version = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.params = np.ndarray((n_params,), dtype=np.float32, buffer=self.shm.buf, offset=8)
+
+    def __reduce__(self):
+        return (SharedWeights, (self.n_params, self.shm.name))
+
+    def publish(self, module):
+        """Copy module's parameters in (learner side)."""
+        self.version[0] += 1
+        self.params[:] = parameters_to_vector(module.parameters()).detach().cpu().numpy()
+        self.version[0] += 1
+
+    def load(self, module, version):
+        """Copy the parameters into module if they changed since `version`; return the version held."""
+        current = int(self.version[0])
+        if current == version or current % 2:
+            return version
+        params = self.params.copy()
+        if int(self.version[0]) != current:
+            return version  # Published meanwhile: try again next time.
+        vector_to_parameters(th.from_numpy(params), module.parameters())
+        return current
+
+    def close(self, unlink=False):
+        del self.version, self.params
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# --- Actor process ---
+def run_actor(vec_env, n_envs, seed, observation, window_size, q_net, weights, ring, epsilons,
+              sync_interval, stop):
+    """Act with the latest published weights and push every step into the ring until stop is set."""
+    th.set_num_threads(1)
+    env = make_env(vec_env, n_envs, seed, observation, window_size)
+    rng = np.random.default_rng(seed)
+    q_net.set_training_mode(False)
+    version = weights.load(q_net, -1)
+    obs = env.reset()
+    steps = 0
+    while not stop.is_set():
+        if steps % sync_interval == 0:
+            version = weights.load(q_net, version)
+        with th.no_grad():
+            actions = q_net(th.as_tensor(obs)).argmax(dim=1).numpy()
+        explore = rng.random(n_envs) < epsilons
+        actions[explore] = rng.integers(0, env.action_space.n, size=int(explore.sum()))
+
+        new_obs, rewards, dones, infos = env.step(actions)
+        next_obs = new_obs
+        truncated = np.zeros(n_envs, dtype=bool)
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            next_obs = new_obs.copy()
+            for i in finished:
+                next_obs[i] = infos[i]["terminal_observation"]
+                truncated[i] = infos[i].get("TimeLimit.truncated", False)
+        ring.push(obs, next_obs, actions, rewards, dones, truncated)
+        obs = new_obs
+        steps += 1
+    env.close()
+
+
+# --- Learner ---
+class ApexLearner:
+    """
+    Ape-X style training: `actors` processes each run `envs_per_actor` Snake
+    envs with their own copy of the Q-network and fixed exploration rates,
+    and push their transitions into TransitionRings. This process trains
+    continuously: it moves the new transitions into the model's replay buffer,
+    takes gradient steps, updates the target network every
+    `target_update_interval` gradient steps and publishes the weights to the
+    actors through SharedWeights every `sync_interval` gradient steps.
+
+    The model is a PrioritizedDQN for grid observations (prioritized replay,
+    as in Ape-X) and a plain DQN for features; model_kwargs go to its
+    constructor.
+    """
+
+    def __init__(self, actors=4, envs_per_actor=8, vec_env="batched", seed=None, observation="grid",
+                 window_size=0, ring_size=4096, sync_interval=50, actor_sync_interval=100,
+                 target_update_interval=1000, batch_size=32, learning_starts=10000, **model_kwargs):
+        self.actors = actors
+        self.envs_per_actor = envs_per_actor
+        self.vec_env = vec_env
+        self.seed = seed
+        self.observation = observation
+        self.window_size = window_size
+        self.sync_interval = sync_interval
+        self.actor_sync_interval = actor_sync_interval
+        self.target_update_interval = target_update_interval
+        self.batch_size = batch_size
+        self.learning_starts = learning_starts
+
+        # The learner's env only provides the spaces (and n_envs, to match the rows).
+        self.env = make_env(vec_env, envs_per_actor, seed, observation, window_size)
+        model_cls = PrioritizedDQN if observation == "grid" else DQN
+        self.model = model_cls("MlpPolicy", self.env, seed=seed, batch_size=batch_size,
+                               learning_starts=learning_starts, **model_kwargs)
+        self.model.set_logger(configure(None, [""]))
+
+        obs_space = self.env.observation_space
+        self.rings = [TransitionRing(ring_size, envs_per_actor, obs_space.shape, obs_space.dtype)
+                      for _ in range(actors)]
+        self.weights = SharedWeights(sum(p.numel() for p in self.model.q_net.parameters()))
+        self.weights.publish(self.model.q_net)
+        self.epsilons = actor_epsilons(actors * envs_per_actor).reshape(actors, envs_per_actor)
+        self.stop = mp.Event()
+        self.processes = []
+
+        self.env_steps = 0
+        self.gradient_steps = 0
+        self.episode_returns = np.zeros((actors, envs_per_actor))
+        self.episode_rewards = collections.deque(maxlen=100)
+
+    def start(self):
+        base_seed = self.seed if self.seed is not None else np.random.randint(2 ** 31)
+        for i, ring in enumerate(self.rings):
+            process = mp.Process(target=run_actor, daemon=True, args=(
+                self.vec_env, self.envs_per_actor, base_seed + 1000 * (i + 1), self.observation,
+                self.window_size, self.model.q_net, self.weights, ring, self.epsilons[i],
+                self.actor_sync_interval, self.stop))
+            process.start()
+            self.processes.append(process)
+
+    def check_actors(self):
+        """Raise if an actor has died: they only stop when told to, so no new steps would come."""
+        dead = ["actor {} (exit code {})".format(i, process.exitcode)
+                for i, process in enumerate(self.processes) if not process.is_alive()]
+        if dead:
+            raise RuntimeError("ApexLearner: " + ", ".join(dead) + " died")
+
+    def collect(self):
+        """Move the actors' new steps into the replay buffer; return how many env steps arrived."""
+        buffer = self.model.replay_buffer
+        arrived = 0
+        for i, ring in enumerate(self.rings):
+            for row in ring.pop_all():
+                infos = [{"TimeLimit.truncated": truncated} for truncated in row["truncated"]]
+                buffer.add(row["obs"], row["next_obs"], row["action"], row["reward"], row["done"], infos)
+                returns = self.episode_returns[i]
+                returns += row["reward"]
+                for env_index in np.flatnonzero(row["done"]):
+                    self.episode_rewards.append(returns[env_index])
+                    returns[env_index] = 0.0
+                arrived += self.envs_per_actor
+        self.env_steps += arrived
+        return arrived
+
+    def train_step(self):
+        model = self.model
+        model._current_progress_remaining = max(1.0 - self.env_steps / float(self.total_timesteps), 0.0)
+        model.train(gradient_steps=1, batch_size=self.batch_size)
+        self.gradient_steps += 1
+        if self.gradient_steps % self.target_update_interval == 0:
+            polyak_update(model.q_net.parameters(), model.q_net_target.parameters(), model.tau)
+            polyak_update(model.batch_norm_stats, model.batch_norm_stats_target, 1.0)
+        if self.gradient_steps % self.sync_interval == 0:
+            self.weights.publish(model.q_net)
+
+    def learn(self, total_timesteps, print_interval=10.0):
+        """Train until the actors have taken total_timesteps env steps."""
+        self.total_timesteps = total_timesteps
+        self.start()
+        start_time = last_print = time.perf_counter()
+        try:
+            while self.env_steps < total_timesteps:
+                self.check_actors()
+                arrived = self.collect()
+                if self.model.replay_buffer.size() * self.envs_per_actor < self.learning_starts:
+                    if not arrived:
+                        time.sleep(0.001)
+                else:
+                    for _ in range(self.sync_interval):
+                        self.train_step()
+
+                now = time.perf_counter()
+                if now - last_print >= print_interval:
+                    last_print = now
+                    self.report(now - start_time)
+        finally:
+            self.stop.set()
+            for process in self.processes:
+                process.join(ACTOR_JOIN_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        self.model.num_timesteps = self.env_steps
+        self.report(time.perf_counter() - start_time)
+        return self.model
+
+    def report(self, elapsed):
+        mean_reward = np.mean(self.episode_rewards) if self.episode_rewards else float("nan")
+        dropped = sum(ring.dropped for ring in self.rings)
+        print("Env steps: {}  env-steps/sec: {:.0f}  gradient steps/sec: {:.0f}  "
+              "ep_rew_mean: {:.1f}  dropped steps: {}".format(
+                  self.env_steps, self.env_steps / max(elapsed, 1e-9),
+                  self.gradient_steps / max(elapsed, 1e-9), mean_reward, dropped * self.envs_per_actor))
+
+    def close(self):
+        for ring in self.rings:
+            ring.close(unlink=True)
+        self.weights.close(unlink=True)
+        self.env.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ape-X style Snake DQN: actor processes and one learner.")
+    parser.add_argument("--actors", type=int, default=max(mp.cpu_count() - 1, 1),
+                        help="actor processes (default: one per core, minus the learner's)")
+    parser.add_argument("--envs-per-actor", type=int, default=8,
+                        help="environments stepped together by each actor")
+    parser.add_argument("--vec-env", choices=["batched", "dummy"], default="batched",
+                        help="how each actor runs its envs: one SnakeVecEnv, or SnakeEnvs "
+                             "one after another (default: batched)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--observation", choices=OBSERVATION_MODES, default="grid")
+    parser.add_argument("--window-size", type=int, default=0)
+    parser.add_argument("--timesteps", type=int, default=1000000,
+                        help="total env steps across all actors")
+    parser.add_argument("--buffer-size", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-starts", type=int, default=10000,
+                        help="transitions in the replay buffer before training starts")
+    parser.add_argument("--sync-interval", type=int, default=50,
+                        help="gradient steps between weight broadcasts to the actors")
+    parser.add_argument("--actor-sync-interval", type=int, default=100,
+                        help="steps between an actor's checks for new weights")
+    parser.add_argument("--target-update-interval", type=int, default=1000,
+                        help="gradient steps between target network updates")
+    parser.add_argument("--ring-size", type=int, default=4096,
+                        help="steps each actor's shared-memory ring holds")
+    parser.add_argument("--output", default="dqn_snake_model")
+    parser.add_argument("--print-interval", type=float, default=10.0,
+                        help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    if args.vec_env == "batched" and args.observation != "grid":
+        parser.error("--vec-env batched only supports --observation grid")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_kwargs = {"buffer_size": args.buffer_size}
+    if args.observation == "grid":
+        model_kwargs["replay_buffer_kwargs"] = {"encoding": "packed"}
+    learner = ApexLearner(args.actors, args.envs_per_actor, args.vec_env, args.seed, args.observation,
+                          args.window_size, args.ring_size, args.sync_interval, args.actor_sync_interval,
+                          args.target_update_interval, args.batch_size, args.learning_starts,
+                          **model_kwargs)
+    try:
+        model = learner.learn(args.timesteps, args.print_interval)
+        model.save(args.output)
+        print("Model saved to", args.output)
+    finally:
+        learner.close()
+
+
+# --- Actor-learner entry point ---
+#
+#   python snake_apex.py --actors 7 --envs-per-actor 8 --timesteps 2000000 --seed 0
+#
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from snake_gameRL1 import ACTION_TO_DIRECTION, APPLE_COLORS, SnakeEnv, SnakeState
+from snake_replay import decode_replay, encode_replay, read_replay
+
+# === Replay Archive Format ===
+#
+# Many replay files (snake_replay.py) packed into one append-only file:
+#   file header   magic "SNKA", format version
+#   episodes      one chunk per episode, one after the other:
+#                   chunk header   magic "EPIS", replay size, keyframe interval,
+#                                  number of keyframes, final step count and score
+#                   replay         the bytes of the replay file
+#                   keyframes      fixed-size SnakeState snapshots taken every
+#                                  keyframe interval steps (step 0 included)
+#   index         one (offset, steps, score) record per episode
+#   trailer       index offset, magic "SNKI", number of episodes
+#
+# The archive is read through mmap: the index and keyframes are NumPy views of
+# the mapped file, so opening an archive of thousands of episodes reads almost
+# nothing, and seeking to step s of an episode restores the nearest keyframe
+# before s and simulates at most keyframe interval - 1 steps from there.
+# Adding episodes overwrites the old index and trailer and writes new ones
+# after the new chunks; if a writer dies before that, the index is rebuilt by
+# walking the chunks.
+#
+ARCHIVE_MAGIC     = b"SNKA"
+ARCHIVE_VERSION   = 1
+ARCHIVE_HEADER    = struct.Struct("<4sI")
+CHUNK_MAGIC       = b"EPIS"
+CHUNK_HEADER      = struct.Struct("<4sIIIIq")
+TRAILER_MAGIC     = b"SNKI"
+TRAILER           = struct.Struct("<Q4sI")
+KEYFRAME_INTERVAL = 1000  # Steps between keyframes.
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("steps", "<u4"), ("score", "<i8")])
+
+NO_APPLE = -1
+ACTIONS = {direction: action for action, direction in ACTION_TO_DIRECTION.items()}
+
+
+def keyframe_dtype(grid_width, grid_height):
+    """
+    NumPy record of one keyframe for a grid size. The snake, trap and free cell
+    lists are stored as flattened cell indices in arrays sized for the whole
+    board, with their lengths alongside.
+    """
+    n_cells = grid_width * grid_height
+    return np.dtype([
+        ("step", "<u4"), ("score", "<i8"), ("steps_since_last_trap", "<u4"),
+        ("direction", "u1"), ("apple_color", "u1"), ("done", "u1"), ("apple", "<i4"),
+        ("snake_length", "<u2"), ("n_traps", "<u2"), ("n_free", "<u2"),
+        ("rng", "<u4", (625,)),
+        ("snake", "<u2", (n_cells,)), ("traps", "<u2", (n_cells,)), ("free", "<u2", (n_cells,)),
+    ])
+
+
+def pack_keyframe(keyframe, step, state, grid_width):
+    """Fill the keyframe record with the SnakeState reached after `step` steps."""
+    flat = lambda cells: [y * grid_width + x for (x, y) in cells]
+    keyframe["step"] = step
+    keyframe["score"] = state.score
+    keyframe["steps_since_last_trap"] = state.steps_since_last_trap
+    keyframe["direction"] = ACTIONS[state.direction]
+    keyframe["apple_color"] = APPLE_COLORS.index(state.apple_color)
+    keyframe["done"] = state.done
+    keyframe["apple"] = NO_APPLE if state.apple is None else flat([state.apple])[0]
+    keyframe["snake_length"] = len(state.snake)
+    keyframe["n_traps"] = len(state.traps)
+    keyframe["n_free"] = len(state.free_cells)
+    keyframe["rng"] = state.rng_state[1]
+    keyframe["snake"][:len(state.snake)] = flat(state.snake)
+    keyframe["traps"][:len(state.traps)] = flat(state.traps)
+    keyframe["free"][:len(state.free_cells)] = state.free_cells
+
+
+def unpack_keyframe(keyframe, grid_width):
+    """Return the SnakeState stored in a keyframe record."""
+    cell = lambda index: (index % grid_width, index // grid_width)
+    apple = int(keyframe["apple"])
+    return SnakeState(
+        snake=[cell(i) for i in keyframe["snake"][:keyframe["snake_length"]].tolist()],
+        direction=ACTION_TO_DIRECTION[int(keyframe["direction"])],
+        apple=None if apple == NO_APPLE else cell(apple),
+        apple_color=APPLE_COLORS[keyframe["apple_color"]],
+        traps=[cell(i) for i in keyframe["traps"][:keyframe["n_traps"]].tolist()],
+        steps_since_last_trap=int(keyframe["steps_since_last_trap"]),
+        score=int(keyframe["score"]),
+        done=bool(keyframe["done"]),
+        free_cells=keyframe["free"][:keyframe["n_free"]].tolist(),
+        rng_state=(3, tuple(keyframe["rng"].tolist()), None))
+
+
+def make_env(replay):
+    """A headless SnakeEnv set up for a replay's grid size and trap interval."""
+    env = SnakeEnv(headless=True, copy_observation=False)
+    if (env.grid_width, env.grid_height) != (replay.grid_width, replay.grid_height):
+        raise ValueError("Replay is for a {}x{} grid, SnakeEnv is {}x{}".format(
+            replay.grid_width, replay.grid_height, env.grid_width, env.grid_height))
+    env.trap_interval = replay.trap_interval
+    return env
+
+
+def encode_episode(replay, keyframe_interval=KEYFRAME_INTERVAL):
+    """
+    Re-simulate a replay, taking a keyframe every keyframe_interval steps, and
+    return (chunk bytes, steps, final score).
+    """
+    env = make_env(replay)
+    env.seed(replay.seed)
+    env.reset()
+    steps = len(replay.actions)
+    keyframes = np.zeros(steps // keyframe_interval + 1, dtype=keyframe_dtype(env.grid_width, env.grid_height))
+    for step, action in enumerate(replay.actions):
+        if step % keyframe_interval == 0:
+            pack_keyframe(keyframes[step // keyframe_interval], step, env.get_state(), env.grid_width)
+        env.step(action)
+    if steps % keyframe_interval == 0:
+        pack_keyframe(keyframes[-1], steps, env.get_state(), env.grid_width)
+
+    replay_bytes = encode_replay(replay)
+    header = CHUNK_HEADER.pack(CHUNK_MAGIC, len(replay_bytes), keyframe_interval, len(keyframes), steps, env.score)
+    return header + replay_bytes + keyframes.tobytes(), steps, env.score
+
+
+def read_index(data):
+    """
+    Return the episode index of the archive bytes (an INDEX_DTYPE array) and
+    where new episodes go: from the trailer, or by walking the chunks if the
+    archive has none (a writer stopped before writing it).
+    """
+    magic, version = ARCHIVE_HEADER.unpack_from(data)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Not a Snake replay archive (bad magic {!r})".format(magic))
+    if version != ARCHIVE_VERSION:
+        raise ValueError("Unsupported archive version: {}".format(version))
+
+    if len(data) >= ARCHIVE_HEADER.size + TRAILER.size:
+        index_offset, magic, count = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if magic == TRAILER_MAGIC and index_offset + count * INDEX_DTYPE.itemsize + TRAILER.size == len(data):
+            return np.frombuffer(data, INDEX_DTYPE, count, index_offset), index_offset
+
+    entries = []
+    offset = ARCHIVE_HEADER.size
+    while offset + CHUNK_HEADER.size <= len(data):
+        magic, replay_size, _, n_keyframes, steps, score = CHUNK_HEADER.unpack_from(data, offset)
+        if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + replay_size > len(data):
+            break
+        replay = decode_replay(memoryview(data)[offset + CHUNK_HEADER.size:offset + CHUNK_HEADER.size + replay_size])
+        size = (CHUNK_HEADER.size + replay_size +
+                n_keyframes * keyframe_dtype(replay.grid_width, replay.grid_height).itemsize)
+        if offset + size > len(data):
+            break  # Chunk cut short.
+        entries.append((offset, steps, score))
+        offset += size
+    return np.array(entries, dtype=INDEX_DTYPE), offset
+
+
+# --- Writing ---
+class ArchiveWriter:
+    """
+    Appends episodes to an archive (created if it doesn't exist). The chunks
+    already in the file are never rewritten, nor read: opening maps the file
+    and reads only its index (or the chunk headers, if it has none). close()
+    writes the new index.
+    """
+
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, "r+b")
+            with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                index, end = read_index(data)
+                self.index = [tuple(entry) for entry in index.tolist()]
+                del index  # A view of the mapping: drop it before unmapping.
+            self.file.seek(end)
+            self.file.truncate()
+        else:
+            self.file = open(path, "wb")
+            self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+            self.index = []
+
+    def add(self, replay):
+        """Append a Replay and return its episode number."""
+        chunk, steps, score = encode_episode(replay, self.keyframe_interval)
+        self.index.append((self.file.tell(), steps, score))
+        self.file.write(chunk)
+        return len(self.index) - 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(TRAILER.pack(index_offset, TRAILER_MAGIC, len(self.index)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Reading ---
+class ReplayArchive:
+    """
+    Read-only view of an archive through mmap.
+
+    len(archive) is the number of episodes and archive.index their offsets,
+    step counts and final scores. seek(episode, step) returns a SnakeEnv at that
+    point of the game, ready for render() or for playing on with play().
+
+    archive.index and the keyframes returned by episode() are views of the
+    mapping. close() can only unmap the file once no such view is left; while
+    a caller still holds one, the file is unmapped when the last view is
+    garbage collected instead.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index, _ = read_index(self.data)
+        self._views = {}  # Episode -> (replay, keyframes), decoded on first use.
+
+    def __len__(self):
+        return len(self.index)
+
+    def episode(self, episode):
+        """Return (Replay, keyframes array) of an episode; the keyframes are a view of the file."""
+        if episode not in self._views:
+            offset = int(self.index[episode]["offset"])
+            _, replay_size, interval, n_keyframes, _, _ = CHUNK_HEADER.unpack_from(self.data, offset)
+            start = offset + CHUNK_HEADER.size
+            replay = decode_replay(memoryview(self.data)[start:start + replay_size])
+            keyframes = np.frombuffer(self.data, keyframe_dtype(replay.grid_width, replay.grid_height),
+                                      n_keyframes, start + replay_size)
+            self._views[episode] = (replay, keyframes, interval)
+        replay, keyframes, _ = self._views[episode]
+        return replay, keyframes
+
+    def seek(self, episode, step=0, env=None):
+        """Return env (a new headless SnakeEnv by default) at the state after `step` steps of an episode."""
+        replay, keyframes = self.episode(episode)
+        interval = self._views[episode][2]
+        step = min(step, len(replay.actions))
+        if env is None:
+            env = make_env(replay)
+        keyframe = keyframes[min(step // interval, len(keyframes) - 1)]
+        env.set_state(unpack_keyframe(keyframe, replay.grid_width))
+        for action in replay.actions[keyframe["step"]:step]:
+            env.step(action)
+        return env
+
+    def play(self, episode, start=0, stop=None, env=None):
+        """Yield (step, env) from step `start` to `stop` (default: the end) of an episode."""
+        replay = self.episode(episode)[0]  # Don't keep the keyframes view alive.
+        stop = len(replay.actions) if stop is None else min(stop, len(replay.actions))
+        env = self.seek(episode, start, env)
+        yield start, env
+        for step in range(start, stop):
+            env.step(replay.actions[step])
+            yield step + 1, env
+
+    def close(self):
+        self._views = {}
+        self.index = None
+        if self.data is not None:
+            try:
+                self.data.close()
+            except BufferError:
+                pass  # A caller still holds a view: unmapped when the last one goes.
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Archive tool ---
+#
+#   python snake_archive.py pack games.snka replays/*.snkr
+#   python snake_archive.py list games.snka
+#   python snake_archive.py show games.snka 12000 --start 5000
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack replay files into an archive and play them back.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser("pack", help="append replay files to an archive")
+    pack_parser.add_argument("archive")
+    pack_parser.add_argument("replays", nargs="+")
+    pack_parser.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL,
+                             help="steps between keyframes (default: %(default)s)")
+    list_parser = commands.add_parser("list", help="list the episodes of an archive")
+    list_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="watch an episode from a given step")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("episode", type=int)
+    show_parser.add_argument("--start", type=int, default=0, help="first step to show")
+    show_parser.add_argument("--stop", type=int, default=None, help="last step to show")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        with ArchiveWriter(args.archive, args.keyframe_interval) as writer:
+            for path in args.replays:
+                episode = writer.add(read_replay(path))
+                print("{} -> episode {}".format(path, episode))
+    elif args.command == "list":
+        with ReplayArchive(args.archive) as archive:
+            for episode, (offset, steps, score) in enumerate(archive.index.tolist()):
+                print("episode {}: {} steps, score {} (offset {})".format(episode, steps, score, offset))
+    else:
+        with ReplayArchive(args.archive) as archive:
+            for step, env in archive.play(args.episode, args.start, args.stop):
+                env.headless = False  # Draw in a window (10 frames per second).
+                env.render()
+                if env.window is None:
+                    break  # Window closed.
+            env.close()
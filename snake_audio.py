@@ -0,0 +1,67 @@
+import heapq
+
+import pygame
+
+
+class AudioManager:
+    """
+    Plays sound effects without ever blocking the game loop.
+
+    play() puts the requested plays into a schedule (time due in ms, sound);
+    update(), called once per frame, starts the plays that are due, each on
+    the next of a few mixer channels reserved for the game, so repeated plays
+    overlap instead of cutting each other off. A muted manager (headless runs,
+    --mute) ignores everything and never touches the mixer.
+    """
+
+    def __init__(self, muted=False, channels=4):
+        self.muted = muted
+        self.pending = []   # Heap of (due time in ms, order, sound).
+        self.order = 0
+        self.channels = []
+        self.next_channel = 0
+        if not muted:
+            pygame.mixer.set_reserved(channels)
+            self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+
+    def play(self, sound, repeats=1, interval_ms=0):
+        """Play sound `repeats` times, interval_ms apart (the first one right away)."""
+        if self.muted or sound is None:
+            return
+        now = pygame.time.get_ticks()
+        for i in range(repeats):
+            heapq.heappush(self.pending, (now + i * interval_ms, self.order, sound))
+            self.order += 1
+        self.update()
+
+    def update(self):
+        """Start the plays that are due. Call once per frame."""
+        if not self.pending:
+            return
+        now = pygame.time.get_ticks()
+        while self.pending and self.pending[0][0] <= now:
+            _, _, sound = heapq.heappop(self.pending)
+            self.channels[self.next_channel].play(sound)
+            self.next_channel = (self.next_channel + 1) % len(self.channels)
+
+    def finish(self, timeout_ms=2000):
+        """
+        When the game is over: let the scheduled plays start and the channels
+        fall silent (at most timeout_ms) before pygame is shut down.
+        """
+        end = pygame.time.get_ticks() + timeout_ms
+        while ((self.pending or any(channel.get_busy() for channel in self.channels)) and
+               pygame.time.get_ticks() < end):
+            self.update()
+            pygame.time.wait(10)
+
+    def stop(self):
+        """Drop the scheduled plays and silence the reserved channels."""
+        self.pending = []
+        for channel in self.channels:
+            channel.stop()
+
+
+def add_audio_arguments(parser):
+    """Add the --mute option to a game's argument parser."""
+    parser.add_argument("--mute", action="store_true", help="no sound (always the case with --headless)")
@@ -0,0 +1,314 @@
+import importlib.util
+import os
+import random
+import time
+from collections import deque
+
+# === Configuration Constants ===
+GRID_WIDTH  = 20
+GRID_HEIGHT = 20
+
+# Directions (dx, dy), in the same order the BFS players expand them.
+UP    = (0, -1)
+DOWN  = (0,  1)
+LEFT  = (-1, 0)
+RIGHT = (1,  0)
+
+
+class BitboardGrid:
+    """
+    Breadth-first search on a board stored as a Python big-int bitboard
+    (bit y * width + x is cell (x, y)).
+
+    The whole frontier is expanded at once with shift-and-mask, one layer per
+    distance. The path is then recovered from the layers: the dict-based bfs()
+    of the game scripts expands UP, DOWN, LEFT, RIGHT in that order, which makes
+    its path the lexicographically smallest shortest path in that direction order.
+    Walking forward from the start and always taking the first direction that
+    stays on a shortest path to the target therefore gives exactly the same path.
+    """
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        first_col = 0
+        last_col = 0
+        for y in range(height):
+            first_col |= 1 << (y * width)
+            last_col |= 1 << (y * width + width - 1)
+        self.not_first_col = self.full & ~first_col
+        self.not_last_col = self.full & ~last_col
+
+    def cells_to_bits(self, cells):
+        """Return the bitboard of an iterable of (x, y) cells."""
+        width = self.width
+        if self.full.bit_length() <= 1024:
+            bits = 0
+            for (x, y) in cells:
+                bits |= 1 << (y * width + x)
+            return bits
+        # On big boards each OR into the int costs O(board), so set bytes first.
+        buffer = bytearray((width * self.height + 7) // 8)
+        for (x, y) in cells:
+            i = y * width + x
+            buffer[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buffer, "little")
+
+    def neighbours(self, bits):
+        """Return every cell orthogonally adjacent to a cell in bits."""
+        width = self.width
+        return (((bits << 1) & self.not_first_col) |
+                ((bits >> 1) & self.not_last_col) |
+                ((bits << width) & self.full) |
+                (bits >> width))
+
+    def cell_bit(self, cell):
+        """Return the bit of cell (x, y), or 0 if it is off the board."""
+        x, y = cell
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        return 1 << (y * self.width + x)
+
+    def free_bits(self, snake, traps=(), allow_tail_as_free=False):
+        """Return the bitboard of cells that are neither snake nor trap."""
+        obstacles = self.cells_to_bits(snake) | self.cells_to_bits(traps)
+        if allow_tail_as_free and snake:
+            obstacles &= ~self.cell_bit(snake[-1])
+        return self.full & ~obstacles
+
+    def flood(self, start_bit, free, target_bit=0):
+        """
+        Flood fill from start_bit through the free cells one layer (distance) at a time.
+        Returns the list of layers; stops early once target_bit is reached.
+        """
+        layers = [start_bit]
+        visited = start_bit
+        frontier = start_bit
+        while not frontier & target_bit:
+            frontier = self.neighbours(frontier) & free & ~visited
+            if not frontier:
+                break
+            visited |= frontier
+            layers.append(frontier)
+        return layers
+
+    def flood_fill(self, start_bit, free, limit=None):
+        """
+        Flood fill from start_bit through the free cells. Returns (visited bits,
+        number of cells); with a limit, stops once at least limit cells are reached.
+        """
+        visited = frontier = start_bit
+        count = 1
+        while frontier and (limit is None or count < limit):
+            frontier = self.neighbours(frontier) & free & ~visited
+            visited |= frontier
+            count += bin(frontier).count("1")
+        return visited, count
+
+    def walk(self, start, layers, target_bit):
+        """Recover the path from start to target_bit, which lies in the last of the layers."""
+        # Walk the layers back from the target, keeping only cells on a shortest path.
+        on_path = [0] * len(layers)
+        on_path[-1] = target_bit
+        for k in range(len(layers) - 2, 0, -1):
+            on_path[k] = layers[k] & self.neighbours(on_path[k + 1])
+
+        # Walk forward taking the first direction that stays on a shortest path.
+        width = self.width
+        path = []
+        x, y = start
+        for k in range(1, len(layers)):
+            for (dx, dy) in (UP, DOWN, LEFT, RIGHT):
+                nx, ny = x + dx, y + dy
+                if (0 <= nx < width and 0 <= ny < self.height and
+                        on_path[k] >> (ny * width + nx) & 1):
+                    x, y = nx, ny
+                    break
+            path.append((x, y))
+        return path
+
+    def bfs(self, start, target, snake, traps=(), allow_tail_as_free=False):
+        """
+        Drop-in replacement for bfs() of the BFS players, with identical results.
+        The snake's body and traps are obstacles; with allow_tail_as_free the tail
+        cell is considered free (since it will move in the next move).
+
+        Returns:
+            A list of grid positions (cells) that is the shortest path from start
+            to target (not including the start cell). Returns None if no path is found.
+        """
+        if start == target:
+            return []
+        target_bit = self.cell_bit(target)
+        free = self.free_bits(snake, traps, allow_tail_as_free)
+        if not target_bit & free:
+            return None
+        layers = self.flood(self.cell_bit(start), free, target_bit)
+        if not layers[-1] & target_bit:
+            return None
+        return self.walk(start, layers, target_bit)
+
+    def reachable(self, start, target, snake, traps=(), allow_tail_as_free=False):
+        """Same as `bfs(...) is not None`, without building the path."""
+        if start == target:
+            return True
+        target_bit = self.cell_bit(target)
+        free = self.free_bits(snake, traps, allow_tail_as_free)
+        if not target_bit & free:
+            return False
+        return bool(self.flood(self.cell_bit(start), free, target_bit)[-1] & target_bit)
+
+
+class DistanceField:
+    """
+    Distances from one start cell, from a single flood fill over the whole
+    reachable board. Any number of queries (path to the fruit, path to the tail,
+    reachable neighbours) are then answered from the stored layers; each path
+    is identical to what bfs() returns for the same target.
+    """
+
+    def __init__(self, grid, start, snake, traps=(), allow_tail_as_free=False):
+        self.grid = grid
+        self.start = start
+        self.layers = grid.flood(grid.cell_bit(start), grid.free_bits(snake, traps, allow_tail_as_free))
+        self.reached = 0
+        for layer in self.layers:
+            self.reached |= layer
+
+    def distance(self, cell):
+        """Return the number of moves from start to cell, or None if it can't be reached."""
+        bit = self.grid.cell_bit(cell)
+        if not bit & self.reached:
+            return None
+        for k, layer in enumerate(self.layers):
+            if layer & bit:
+                return k
+
+    def path_to(self, target):
+        """Return the same path as bfs(start, target, ...), or None if there is none."""
+        d = self.distance(target)
+        if d is None:
+            return None
+        return self.grid.walk(self.start, self.layers[:d + 1], self.grid.cell_bit(target))
+
+    def first_move(self):
+        """Return the first direction (UP, DOWN, LEFT, RIGHT order) to a reachable neighbour, or None."""
+        if len(self.layers) < 2:
+            return None
+        x, y = self.start
+        for (dx, dy) in (UP, DOWN, LEFT, RIGHT):
+            if self.grid.cell_bit((x + dx, y + dy)) & self.layers[1]:
+                return (dx, dy)
+        return None
+
+
+# Bitboard BFS for the standard 20x20 board, used by snake_game3B.py. It has the
+# same signature as bfs() in snake_game.py, snake_game2.py, snake_game2B.py and snake_game3.py.
+bfs = BitboardGrid(GRID_WIDTH, GRID_HEIGHT).bfs
+
+
+# === Benchmark ===
+#
+# Compares the bitboard engine against the dict-based bfs() of the BFS players on
+# random boards (a folded snake plus traps) and checks that the paths match.
+#
+def reference_bfs(start, target, snake, traps, allow_tail_as_free, width, height):
+    """The dict-based bfs() of snake_game2.py, for any board size."""
+    obstacles = set(snake) | set(traps)
+    if allow_tail_as_free and snake:
+        obstacles.remove(snake[-1])
+    queue = deque([start])
+    came_from = {start: None}
+    while queue:
+        current = queue.popleft()
+        if current == target:
+            path = []
+            while current != start:
+                path.append(current)
+                current = came_from[current]
+            path.reverse()
+            return path
+        for d in [UP, DOWN, LEFT, RIGHT]:
+            next_cell = (current[0] + d[0], current[1] + d[1])
+            if (0 <= next_cell[0] < width and
+                0 <= next_cell[1] < height and
+                next_cell not in came_from and
+                next_cell not in obstacles):
+                came_from[next_cell] = current
+                queue.append(next_cell)
+    return None
+
+
+def load_script(filename):
+    """Load one of the game scripts as a module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def random_board(rng, width, height):
+    """
+    Return (snake, traps, targets) for a random board: a snake folded back and
+    forth across a band of rows (as long snakes tend to be), plus random traps.
+    """
+    length = rng.randint(3, width * height // 3)
+    top = rng.randrange(height - (length + width - 1) // width + 1)
+    body = []
+    for i in range(length):
+        row, col = divmod(i, width)
+        x = col if row % 2 == 0 else width - 1 - col
+        body.append((x, top + row))
+    snake = body[::-1]  # The head is the last cell laid down.
+    occupied = set(snake)
+    traps = []
+    for _ in range(rng.randint(0, width * height // 8)):
+        cell = (rng.randrange(width), rng.randrange(height))
+        if cell not in occupied:
+            traps.append(cell)
+            occupied.add(cell)
+    targets = [(rng.randrange(width), rng.randrange(height)) for _ in range(3)] + [snake[-1]]
+    return snake, traps, targets
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    snake_game = load_script("snake_game.py")      # bfs() without traps
+    snake_game2b = load_script("snake_game2B.py")  # bfs() with traps, tail always an obstacle
+    grid = BitboardGrid(GRID_WIDTH, GRID_HEIGHT)
+
+    # Identity check on the standard board.
+    for _ in range(200):
+        snake, traps, targets = random_board(rng, GRID_WIDTH, GRID_HEIGHT)
+        field = DistanceField(grid, snake[0], snake, traps, allow_tail_as_free=True)
+        for target in targets:
+            assert snake_game.bfs(snake[0], target, snake, allow_tail_as_free=True) == \
+                bfs(snake[0], target, snake, allow_tail_as_free=True)
+            assert snake_game2b.bfs(snake[0], target, snake, traps) == bfs(snake[0], target, snake, traps)
+            expected = reference_bfs(snake[0], target, snake, traps, True, GRID_WIDTH, GRID_HEIGHT)
+            assert expected == bfs(snake[0], target, snake, traps, allow_tail_as_free=True)
+            assert expected == field.path_to(target)
+    print("Bitboard bfs() and DistanceField match the dict-based bfs() on 200 random 20x20 boards.")
+
+    print("{:>9} {:>12} {:>12} {:>8}".format("Board", "dict (ms)", "bitboard (ms)", "Speedup"))
+    for size in (20, 50, 100, 200):
+        grid = BitboardGrid(size, size)
+        boards = [random_board(rng, size, size) for _ in range(20)]
+        queries = [(snake, traps, target) for (snake, traps, targets) in boards for target in targets]
+
+        start = time.perf_counter()
+        expected = [reference_bfs(snake[0], target, snake, traps, True, size, size)
+                    for (snake, traps, target) in queries]
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = [grid.bfs(snake[0], target, snake, traps, allow_tail_as_free=True)
+                  for (snake, traps, target) in queries]
+        bit_time = time.perf_counter() - start
+
+        assert result == expected
+        print("{:>9} {:>12.3f} {:>12.3f} {:>7.1f}x".format(
+            "{0}x{0}".format(size), 1000 * dict_time / len(queries),
+            1000 * bit_time / len(queries), dict_time / bit_time))
@@ -0,0 +1,69 @@
+from collections import deque
+
+
+class SnakeBody:
+    """
+    Snake body stored as a deque of flattened cell indices (head first) plus a
+    bytearray occupancy grid, so moving, growing and collision checks are O(1)
+    and cutting the snake costs O(removed segments).
+
+    For reading it behaves like the old list of (x, y) tuples:
+    len(snake), snake[0], snake[-1], iteration and `cell in snake` all work.
+    """
+
+    def __init__(self, cells, grid_width, grid_height):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cells = deque()
+        self.occupied = bytearray(grid_width * grid_height)
+        for (x, y) in cells:
+            index = y * grid_width + x
+            self.cells.append(index)
+            self.occupied[index] = 1
+
+    def _to_cell(self, index):
+        return (index % self.grid_width, index // self.grid_width)
+
+    def push_head(self, cell):
+        """Add a new head segment at cell (x, y)."""
+        x, y = cell
+        index = y * self.grid_width + x
+        self.cells.appendleft(index)
+        self.occupied[index] = 1
+
+    def pop_tail(self):
+        """Remove the tail segment and return its (x, y) cell."""
+        index = self.cells.pop()
+        self.occupied[index] = 0
+        return self._to_cell(index)
+
+    def truncate(self, length):
+        """Cut the snake down to its first `length` segments and return the removed cells."""
+        removed = []
+        while len(self.cells) > length:
+            removed.append(self.pop_tail())
+        return removed
+
+    def copy(self):
+        """Return an independent copy of the body."""
+        body = SnakeBody((), self.grid_width, self.grid_height)
+        body.cells = self.cells.copy()
+        body.occupied = self.occupied[:]
+        return body
+
+    def __contains__(self, cell):
+        x, y = cell
+        if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+            return False
+        return self.occupied[y * self.grid_width + x] == 1
+
+    def __getitem__(self, i):
+        return self._to_cell(self.cells[i])
+
+    def __iter__(self):
+        width = self.grid_width
+        for index in self.cells:
+            yield (index % width, index // width)
+
+    def __len__(self):
+        return len(self.cells)
@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from snake_policy import BACKENDS, load_policy
+from snake_vec_env import SnakeVecEnv
+
+
+def evaluate(policy, boards, episodes, seed=None, max_steps=10000):
+    """
+    Play the policy greedily on `boards` concurrent SnakeVecEnv boards until
+    `episodes` games have finished (or after max_steps vectorized steps, since a
+    policy can circle forever without dying). Every step asks the policy for
+    all boards' actions with a single predict_batch() call.
+
+    Returns (scores, lengths, board_steps, seconds).
+    """
+    env = SnakeVecEnv(boards, seed=seed)
+    obs = env.reset()
+    steps = np.zeros(boards, dtype=np.int64)
+    scores = []
+    lengths = []
+    board_steps = 0
+    start = time.perf_counter()
+    for _ in range(max_steps):
+        obs, _, dones, infos = env.step(policy.predict_batch(obs))
+        steps += 1
+        board_steps += boards
+        for i in np.flatnonzero(dones):
+            scores.append(infos[i]["score"])
+            lengths.append(int(steps[i]))
+            steps[i] = 0
+        if len(scores) >= episodes:
+            break
+    seconds = time.perf_counter() - start
+    env.close()
+    return scores[:episodes], lengths[:episodes], board_steps, seconds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the DQN policy headless on many boards at once.")
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy",
+                        help="how the policy is run (default: %(default)s)")
+    parser.add_argument("--model", default=None, help="model file (default: the backend's default)")
+    parser.add_argument("--boards", type=int, default=256,
+                        help="number of boards played concurrently (default: %(default)s)")
+    parser.add_argument("--episodes", type=int, default=1000,
+                        help="number of finished games to evaluate (default: %(default)s)")
+    parser.add_argument("--max-batch", type=int, default=256,
+                        help="largest batch per forward pass (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="CPU threads for the sb3 and onnx backends (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=10000,
+                        help="stop after this many vectorized steps (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    policy = load_policy(args.backend, args.model, args.max_batch, args.threads)
+    scores, lengths, board_steps, seconds = evaluate(
+        policy, args.boards, args.episodes, args.seed, args.max_steps)
+    if scores:
+        print("Episodes: {}  mean score: {:.1f}  max score: {:.1f}  mean length: {:.1f}".format(
+            len(scores), np.mean(scores), np.max(scores), np.mean(lengths)))
+    else:
+        print("No game finished within", args.max_steps, "steps.")
+    print("Board steps: {}  Board steps/sec: {:.0f}".format(board_steps, board_steps / max(seconds, 1e-9)))
+
+
+# --- Headless evaluation entry point ---
+#
+#   python snake_evaluate.py --backend sb3 --boards 256 --threads 1 --episodes 1000
+#
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import random
+
+
+class FreeCells:
+    """
+    Set of free grid cells kept as an indexable list of flattened cell indices
+    plus a position table, so add, remove and uniform sampling are all O(1)
+    (removal swaps the last entry into the vacated slot).
+
+    Replaces rejection sampling with random.randint, which slows down as the
+    board fills up and never returns once it is full: sample() returns None instead.
+    """
+
+    def __init__(self, grid_width, grid_height):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cells = []
+        self.position = []
+        self.reset()
+
+    def reset(self):
+        """Mark every cell of the grid as free."""
+        n_cells = self.grid_width * self.grid_height
+        self.cells = list(range(n_cells))
+        self.position = list(range(n_cells))
+
+    def restore(self, indices):
+        """Set the free cells to the flattened cell indices, in this order (see SnakeEnv.set_state)."""
+        self.cells = list(indices)
+        self.position = [-1] * (self.grid_width * self.grid_height)
+        for pos, index in enumerate(self.cells):
+            self.position[index] = pos
+
+    def remove(self, cell):
+        """Mark cell (x, y) as occupied (no-op if it is already occupied)."""
+        index = cell[1] * self.grid_width + cell[0]
+        pos = self.position[index]
+        if pos < 0:
+            return
+        last = self.cells.pop()
+        if last != index:
+            self.cells[pos] = last
+            self.position[last] = pos
+        self.position[index] = -1
+
+    def add(self, cell):
+        """Mark cell (x, y) as free again (no-op if it is already free)."""
+        index = cell[1] * self.grid_width + cell[0]
+        if self.position[index] >= 0:
+            return
+        self.position[index] = len(self.cells)
+        self.cells.append(index)
+
+    def sample(self, rng=random):
+        """Return a uniformly random free (x, y) cell, or None if the board is full."""
+        if not self.cells:
+            return None
+        index = self.cells[rng.randrange(len(self.cells))]
+        return (index % self.grid_width, index // self.grid_width)
+
+    def __contains__(self, cell):
+        return self.position[cell[1] * self.grid_width + cell[0]] >= 0
+
+    def __len__(self):
+        return len(self.cells)
@@ -1,19 +1,33 @@
+import argparse
+
 import pygame
 
-from stable_baselines3 import DQN
 from snake_gameRL1 import SnakeEnv  # Ensure your SnakeEnv is accessible
+from snake_policy import add_backend_argument, load_policy
+from snake_replay import ReplayRecorder
+
+parser = argparse.ArgumentParser(description="Watch the trained DQN play SnakeEnv.")
+add_backend_argument(parser)
+parser.add_argument("--seed", type=int, default=None, help="seed of the game (default: a random one)")
+parser.add_argument("--record", metavar="DIR", default=None,
+                    help="save the game as a replay file in DIR (see snake_replay.py)")
+args = parser.parse_args()
 
-# Load the trained model.
-model = DQN.load("dqn_snake_model")
+# Load the trained model (--backend onnx runs it without PyTorch).
+model = load_policy(args.backend, args.model)
 
 # Create the environment.
-env = SnakeEnv()
+env = SnakeEnv(seed=args.seed)
+if args.record:
+    # The recorder draws the game's seed itself, from --seed if given.
+    env = ReplayRecorder(env, args.record, policy_id="dqn:{}:{}".format(args.backend, args.model or "default"),
+                         seed=args.seed)
 
 # Optionally, run the agent.
 obs = env.reset()
 done = False
 while not done:
-    action, _ = model.predict(obs, deterministic=True)
+    action = model.predict(obs)
     obs, reward, done, info = env.step(action)
     env.render()
     # Slow down if needed; in case the game ends too fast
@@ -3,6 +3,9 @@ import random
 import sys
 from collections import deque
 
+from snake_free_cells import FreeCells
+from snake_headless import GameClock, parse_game_args
+
 # === Configuration constants ===
 CELL_SIZE   = 20
 GRID_WIDTH  = 20
@@ -25,12 +28,15 @@ RIGHT = (1,  0)
 
 # === Helper functions ===
 
-def get_random_position(snake):
-    """Return a random grid cell that is not occupied by the snake."""
-    while True:
-        pos = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-        if pos not in snake:
-            return pos
+def get_random_free_position(free_cells, rng):
+    """
+    Return a random free grid cell (x, y) and mark it occupied.
+    Returns None if the board is full.
+    """
+    pos = free_cells.sample(rng)
+    if pos is not None:
+        free_cells.remove(pos)
+    return pos
 
 def bfs(start, target, snake, allow_tail_as_free=False):
     """
@@ -86,11 +92,14 @@ def draw_grid(surface):
 
 # === Main game loop ===
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption("AI Snake Game")
-    clock = pygame.time.Clock()
+def main(headless=False, uncapped=False, trap_ticks=FPS, max_steps=None, stall_steps=None,
+         seed=None):
+    if not headless:
+        pygame.init()
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("AI Snake Game")
+    clock = GameClock(FPS, fixed_tick=headless or uncapped, uncapped=uncapped, trap_ticks=trap_ticks,
+                      stall_steps=stall_steps)
 
     # Initialize snake: start with a length of 3 segments.
     snake = [
@@ -100,17 +109,25 @@ def main():
     ]
     direction = RIGHT
 
+    # Free cells (not snake or fruit) for O(1) fruit placement.
+    # The game's own random generator, so a seed replays the same game.
+    rng = random.Random(seed)
+    free_cells = FreeCells(GRID_WIDTH, GRID_HEIGHT)
+    for cell in snake:
+        free_cells.remove(cell)
+
     # Place the first fruit
-    fruit = get_random_position(snake)
+    fruit = get_random_free_position(free_cells, rng)
 
     running = True
     while running:
-        clock.tick(FPS)
+        clock.tick()
 
         # Handle quit events.
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
 
         # ===== AI DECISION MAKING =====
         # First, try to find a path from the snake's head to the fruit.
@@ -177,12 +194,27 @@ def main():
 
         # If the snake has eaten the fruit:
         if new_head == fruit:
+            clock.progress()
             snake.insert(0, new_head)
-            fruit = get_random_position(snake)
+            fruit = get_random_free_position(free_cells, rng)
+            if fruit is None:
+                print("Board full! Final score:", len(snake))
+                running = False
+                continue
         else:
             # Normal move: add new head and remove tail.
             snake.insert(0, new_head)
-            snake.pop()
+            free_cells.remove(new_head)
+            free_cells.add(snake.pop())
+
+        if max_steps is not None and clock.ticks >= max_steps:
+            print("Step limit reached! Final score:", len(snake))
+            running = False
+        elif clock.stalled():
+            print("No apple for", clock.stall_steps, "steps! Final score:", len(snake))
+            running = False
+        if headless:
+            continue
 
         # ===== DRAWING =====
         screen.fill(BLACK)
@@ -195,8 +227,11 @@ def main():
         draw_grid(screen)
         pygame.display.update()
 
+    clock.report()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    args = parse_game_args("AI Snake Game (BFS player).", FPS)
+    main(args.headless, args.uncapped, args.trap_ticks, args.max_steps, stall_steps=args.stall_steps,
+         seed=args.seed)
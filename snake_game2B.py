@@ -3,6 +3,10 @@ import random
 import sys
 from collections import deque
 
+from snake_free_cells import FreeCells
+from snake_headless import GameClock, parse_game_args
+from snake_sounds import make_sound
+
 # === Configuration constants ===
 CELL_SIZE    = 20
 GRID_WIDTH   = 20
@@ -26,12 +30,21 @@ RIGHT = (1,  0)
 
 # === Helper functions ===
 
-def get_random_free_position(occupied):
-    """Return a random grid cell that is not in the occupied set."""
-    while True:
-        pos = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-        if pos not in occupied:
-            return pos
+def get_random_free_position(free_cells, rng):
+    """
+    Return a random free grid cell (x, y) and mark it occupied.
+    Returns None if the board is full.
+    """
+    pos = free_cells.sample(rng)
+    if pos is not None:
+        free_cells.remove(pos)
+    return pos
+
+def release_cells(free_cells, cells, traps):
+    """Return vacated snake cells to the free set (a cell under a trap stays occupied)."""
+    for cell in cells:
+        if cell not in traps:
+            free_cells.add(cell)
 
 def bfs(start, target, snake, traps):
     """
@@ -81,19 +94,20 @@ def draw_grid(surface):
 
 # === Main game loop ===
 
-def main():
-    pygame.init()
-    # Initialize the mixer for sound.
-    pygame.mixer.init()
-    try:
-        chirp_sound = pygame.mixer.Sound("chirp.wav")
-    except pygame.error:
-        print("Could not load chirp.wav. Please ensure it is in the same folder as this script.")
-        chirp_sound = None
+def main(headless=False, uncapped=False, trap_ticks=FPS, max_steps=None, stall_steps=None,
+         seed=None):
+    chirp_sound = None
+    if not headless:
+        pygame.init()
+        # Initialize the mixer for sound.
+        pygame.mixer.init()
+        # The chirp is synthesized in memory (snake_sounds.py), no WAV file needed.
+        chirp_sound = make_sound("chirp")
 
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption("AI Snake Game with Traps")
-    clock = pygame.time.Clock()
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("AI Snake Game with Traps")
+    clock = GameClock(FPS, fixed_tick=headless or uncapped, uncapped=uncapped, trap_ticks=trap_ticks,
+                      stall_steps=stall_steps)
 
     # Initialize snake: start with 3 segments.
     snake = [
@@ -105,29 +119,32 @@ def main():
 
     # Initialize traps list (each trap is a grid cell that stays on the board)
     traps = []
-    # We'll add one trap every 1000 ms (1 second).
-    last_trap_time = pygame.time.get_ticks()
+
+    # Free cells (not snake, trap or fruit) for O(1) fruit and trap placement.
+    # The game's own random generator, so a seed replays the same game.
+    rng = random.Random(seed)
+    free_cells = FreeCells(GRID_WIDTH, GRID_HEIGHT)
+    for cell in snake:
+        free_cells.remove(cell)
 
     # Place the first fruit (avoid snake and traps)
-    occupied_for_fruit = set(snake) | set(traps)
-    fruit = get_random_free_position(occupied_for_fruit)
+    fruit = get_random_free_position(free_cells, rng)
 
     running = True
     while running:
-        clock.tick(FPS)
-        current_time = pygame.time.get_ticks()
+        clock.tick()
 
         # Add a new trap every 1 second.
-        if current_time - last_trap_time >= 1000:
-            occupied_for_trap = set(snake) | set(traps) | {fruit}
-            new_trap = get_random_free_position(occupied_for_trap)
-            traps.append(new_trap)
-            last_trap_time = current_time
+        if clock.trap_due():
+            new_trap = get_random_free_position(free_cells, rng)
+            if new_trap is not None:  # No trap when the board is full.
+                traps.append(new_trap)
 
         # Handle quit events.
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
 
         # ===== AI DECISION MAKING =====
         # Try to find a path from the snake's head to the fruit.
@@ -151,7 +168,7 @@ def main():
             else:
                 # Fallback: try following the tail.
                 path_to_tail = bfs(snake[0], snake[-1], snake, traps)
-                if path_to_tail is not None:
+                if path_to_tail:
                     next_cell = path_to_tail[0]
                     direction = get_direction(snake[0], next_cell)
                 else:
@@ -167,7 +184,7 @@ def main():
         else:
             # No path to the fruit found; try moving toward the tail.
             path_to_tail = bfs(snake[0], snake[-1], snake, traps)
-            if path_to_tail is not None:
+            if path_to_tail:
                 next_cell = path_to_tail[0]
                 direction = get_direction(snake[0], next_cell)
             else:
@@ -196,21 +213,36 @@ def main():
         if new_head in traps:
             snake.insert(0, new_head)
             new_length = max(1, len(snake) // 2)
+            release_cells(free_cells, snake[new_length:], traps)
             snake = snake[:new_length]
             print("Hit trap! Snake length cut to half. New length:", len(snake))
         # If the snake eats the fruit:
         elif new_head == fruit:
+            clock.progress()
             snake.insert(0, new_head)
             # Play the chirp sound if it loaded successfully.
             if chirp_sound:
                 chirp_sound.play()
             # Place a new fruit (avoid snake and traps).
-            occupied_for_fruit = set(snake) | set(traps)
-            fruit = get_random_free_position(occupied_for_fruit)
+            fruit = get_random_free_position(free_cells, rng)
+            if fruit is None:
+                print("Board full! Final score:", len(snake))
+                running = False
+                continue
         else:
             # Normal move: add new head and remove tail.
             snake.insert(0, new_head)
-            snake.pop()
+            free_cells.remove(new_head)
+            release_cells(free_cells, [snake.pop()], traps)
+
+        if max_steps is not None and clock.ticks >= max_steps:
+            print("Step limit reached! Final score:", len(snake))
+            running = False
+        elif clock.stalled():
+            print("No apple for", clock.stall_steps, "steps! Final score:", len(snake))
+            running = False
+        if headless:
+            continue
 
         # ===== DRAWING =====
         screen.fill(BLACK)
@@ -226,8 +258,11 @@ def main():
         draw_grid(screen)
         pygame.display.update()
 
+    clock.report()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    args = parse_game_args("AI Snake Game with Traps and sound (BFS player).", FPS)
+    main(args.headless, args.uncapped, args.trap_ticks, args.max_steps, stall_steps=args.stall_steps,
+         seed=args.seed)
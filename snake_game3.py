@@ -1,7 +1,11 @@
 import pygame
 import random
 import sys
-from collections import deque
+
+from snake_bitboard_bfs import BitboardGrid, DistanceField
+from snake_free_cells import FreeCells
+from snake_headless import GameClock, parse_game_args
+from snake_sounds import make_sound
 
 # === Configuration constants ===
 CELL_SIZE    = 20
@@ -24,51 +28,26 @@ DOWN  = (0,  1)
 LEFT  = (-1, 0)
 RIGHT = (1,  0)
 
+# Bitboard BFS engine for this board (see snake_bitboard_bfs.py).
+GRID = BitboardGrid(GRID_WIDTH, GRID_HEIGHT)
+
 # === Helper functions ===
 
-def get_random_free_position(occupied):
+def get_random_free_position(free_cells, rng):
     """
-    Returns a random grid cell (x, y) that is not in the occupied set.
+    Return a random free grid cell (x, y) and mark it occupied.
+    Returns None if the board is full.
     """
-    while True:
-        pos = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-        if pos not in occupied:
-            return pos
+    pos = free_cells.sample(rng)
+    if pos is not None:
+        free_cells.remove(pos)
+    return pos
 
-def bfs(start, target, snake, traps):
-    """
-    Uses Breadth-First Search (BFS) to find a path from start to target.
-    The snake’s body (all segments, including tail) and traps are considered obstacles.
-    
-    Returns:
-        A list of grid positions (cells) representing the shortest path from start
-        to target (excluding the start cell). Returns None if no path is found.
-    """
-    obstacles = set(snake) | set(traps)
-    queue = deque([start])
-    came_from = {start: None}
-
-    while queue:
-        current = queue.popleft()
-        if current == target:
-            # Reconstruct path from target back to start.
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            path.reverse()
-            return path
-
-        # Check all four neighboring cells.
-        for d in [UP, DOWN, LEFT, RIGHT]:
-            next_cell = (current[0] + d[0], current[1] + d[1])
-            if (0 <= next_cell[0] < GRID_WIDTH and
-                0 <= next_cell[1] < GRID_HEIGHT and
-                next_cell not in came_from and
-                next_cell not in obstacles):
-                came_from[next_cell] = current
-                queue.append(next_cell)
-    return None
+def release_cells(free_cells, cells, traps):
+    """Return vacated snake cells to the free set (a cell under a trap stays occupied)."""
+    for cell in cells:
+        if cell not in traps:
+            free_cells.add(cell)
 
 def get_direction(from_cell, to_cell):
     """Return the (dx, dy) direction from from_cell to an adjacent to_cell."""
@@ -83,18 +62,19 @@ def draw_grid(surface):
 
 # === Main game loop ===
 
-def main():
-    pygame.init()
-    pygame.mixer.init()
-    try:
-        chirp_sound = pygame.mixer.Sound("chirp.wav")
-    except pygame.error:
-        print("Could not load chirp.wav. Please ensure it is in the same folder as this script.")
-        chirp_sound = None
+def main(headless=False, uncapped=False, trap_ticks=FPS, max_steps=None, stall_steps=None,
+         seed=None):
+    chirp_sound = None
+    if not headless:
+        pygame.init()
+        pygame.mixer.init()
+        # The chirp is synthesized in memory (snake_sounds.py), no WAV file needed.
+        chirp_sound = make_sound("chirp")
 
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption("AI Snake Game with Traps")
-    clock = pygame.time.Clock()
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("AI Snake Game with Traps")
+    clock = GameClock(FPS, fixed_tick=headless or uncapped, uncapped=uncapped, trap_ticks=trap_ticks,
+                      stall_steps=stall_steps)
 
     # Initialize snake: starting with 3 segments.
     snake = [
@@ -106,51 +86,52 @@ def main():
 
     # Initialize traps list (each trap is a grid cell that remains on the board)
     traps = []
-    last_trap_time = pygame.time.get_ticks()
+
+    # Free cells (not snake, trap or fruit) for O(1) fruit and trap placement.
+    # The game's own random generator, so a seed replays the same game.
+    rng = random.Random(seed)
+    free_cells = FreeCells(GRID_WIDTH, GRID_HEIGHT)
+    for cell in snake:
+        free_cells.remove(cell)
 
     # Place the first fruit (avoid snake and traps)
-    occupied_for_fruit = set(snake) | set(traps)
-    fruit = get_random_free_position(occupied_for_fruit)
+    fruit = get_random_free_position(free_cells, rng)
 
     running = True
     while running:
-        clock.tick(FPS)
-        current_time = pygame.time.get_ticks()
+        clock.tick()
 
         # Add a new trap every 1 second.
-        if current_time - last_trap_time >= 1000:
-            occupied_for_trap = set(snake) | set(traps) | {fruit}
-            new_trap = get_random_free_position(occupied_for_trap)
-            traps.append(new_trap)
-            last_trap_time = current_time
+        if clock.trap_due():
+            new_trap = get_random_free_position(free_cells, rng)
+            if new_trap is not None:  # No trap when the board is full.
+                traps.append(new_trap)
 
         # Process events.
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
 
         # ===== AI DECISION MAKING =====
+        # One BFS from the head answers the fruit, tail and fallback queries.
+        field = DistanceField(GRID, snake[0], snake, traps)
         # Prioritize following a direct path to the fruit.
-        path_to_fruit = bfs(snake[0], fruit, snake, traps)
+        path_to_fruit = field.path_to(fruit)
         if path_to_fruit is not None:
             next_cell = path_to_fruit[0]
             direction = get_direction(snake[0], next_cell)
         else:
             # If no path to fruit exists, try following the tail.
-            path_to_tail = bfs(snake[0], snake[-1], snake, traps)
-            if path_to_tail is not None:
+            path_to_tail = field.path_to(snake[-1])
+            if path_to_tail:
                 next_cell = path_to_tail[0]
                 direction = get_direction(snake[0], next_cell)
             else:
                 # As a last resort, pick any valid move.
-                for d in [UP, DOWN, LEFT, RIGHT]:
-                    next_cell = (snake[0][0] + d[0], snake[0][1] + d[1])
-                    if (0 <= next_cell[0] < GRID_WIDTH and
-                        0 <= next_cell[1] < GRID_HEIGHT and
-                        next_cell not in snake and
-                        next_cell not in traps):
-                        direction = d
-                        break
+                move = field.first_move()
+                if move is not None:
+                    direction = move
 
         # ===== MOVE THE SNAKE =====
         new_head = (snake[0][0] + direction[0], snake[0][1] + direction[1])
@@ -167,20 +148,35 @@ def main():
         if new_head in traps:
             snake.insert(0, new_head)
             new_length = max(1, len(snake) // 2)
+            release_cells(free_cells, snake[new_length:], traps)
             snake = snake[:new_length]
             print("Hit trap! Snake length cut to half. New length:", len(snake))
         # If the snake eats the fruit:
         elif new_head == fruit:
+            clock.progress()
             snake.insert(0, new_head)
             if chirp_sound:
                 chirp_sound.play()
             # Place a new fruit (avoid snake and traps).
-            occupied_for_fruit = set(snake) | set(traps)
-            fruit = get_random_free_position(occupied_for_fruit)
+            fruit = get_random_free_position(free_cells, rng)
+            if fruit is None:
+                print("Board full! Final score:", len(snake))
+                running = False
+                continue
         else:
             # Normal move: add the new head and remove the tail.
             snake.insert(0, new_head)
-            snake.pop()
+            free_cells.remove(new_head)
+            release_cells(free_cells, [snake.pop()], traps)
+
+        if max_steps is not None and clock.ticks >= max_steps:
+            print("Step limit reached! Final score:", len(snake))
+            running = False
+        elif clock.stalled():
+            print("No apple for", clock.stall_steps, "steps! Final score:", len(snake))
+            running = False
+        if headless:
+            continue
 
         # ===== DRAWING =====
         screen.fill(BLACK)
@@ -196,8 +192,11 @@ def main():
         draw_grid(screen)
         pygame.display.update()
 
+    clock.report()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    args = parse_game_args("AI Snake Game with Traps and sound (BFS player).", FPS)
+    main(args.headless, args.uncapped, args.trap_ticks, args.max_steps, stall_steps=args.stall_steps,
+         seed=args.seed)
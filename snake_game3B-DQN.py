@@ -1,8 +1,17 @@
 import pygame
+import functools
 import random
 import sys
 import numpy as np
-from stable_baselines3 import DQN  # Used to load the trained model
+
+from snake_body import SnakeBody
+from snake_free_cells import FreeCells
+from snake_headless import GameClock, game_arg_parser
+from snake_audio import AudioManager, add_audio_arguments
+from snake_renderer import BoardRenderer
+from snake_sounds import make_sound
+from snake_planner import PLANNER_DEADLINE_MS, BackgroundPlanner, add_planner_arguments, safe_move
+from snake_policy import add_backend_argument, load_policy
 
 # === Configuration Constants ===
 CELL_SIZE    = 20
@@ -47,12 +56,21 @@ OPPOSITE_DIRECTION = {
 
 # === Helper Functions ===
 
-def get_random_free_position(occupied):
-    """Return a random (x, y) position on the grid that is not occupied."""
-    while True:
-        pos = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-        if pos not in occupied:
-            return pos
+def get_random_free_position(free_cells, rng):
+    """
+    Return a random free grid cell (x, y) and mark it occupied.
+    Returns None if the board is full.
+    """
+    pos = free_cells.sample(rng)
+    if pos is not None:
+        free_cells.remove(pos)
+    return pos
+
+def release_cells(free_cells, cells, trap_cells):
+    """Return vacated snake cells to the free set (a cell under a trap stays occupied)."""
+    for cell in cells:
+        if cell not in trap_cells:
+            free_cells.add(cell)
 
 def get_observation(snake, apple, traps):
     """
@@ -68,106 +86,158 @@ def get_observation(snake, apple, traps):
         obs[y, x] = 3
     return obs
 
-def draw_grid(surface):
-    """Draw grid lines on the provided surface."""
-    for x in range(0, WINDOW_WIDTH, CELL_SIZE):
-        pygame.draw.line(surface, WHITE, (x, 0), (x, WINDOW_HEIGHT))
-    for y in range(0, WINDOW_HEIGHT, CELL_SIZE):
-        pygame.draw.line(surface, WHITE, (0, y), (WINDOW_WIDTH, y))
+def mark_snake(obs, cell):
+    """Mark a snake segment on the observation grid (traps stay on top, as 3)."""
+    x, y = cell
+    if obs[y, x] != 3:
+        obs[y, x] = 1
 
-def play_crash_sound(crash_sound):
+def clear_snake(obs, cell):
+    """Clear a vacated snake segment on the observation grid (a trap underneath stays)."""
+    x, y = cell
+    if obs[y, x] == 1:
+        obs[y, x] = 0
+
+def cell_color(cell, snake, trap_cells, apple, apple_color):
+    """Colour of a board cell (the snake drawn over traps over the apple), None if empty."""
+    if cell in snake:
+        return GREEN
+    if cell in trap_cells:
+        return PURPLE
+    if cell == apple:
+        return apple_color
+    return None
+
+def play_crash_sound(audio, crash_sound):
     """
-    Play the crash sound 2–3 times consecutively with a short delay between plays.
+    Play the crash sound 2–3 times, 300 ms apart, without pausing the game.
     """
     if crash_sound:
-        times = random.randint(2, 3)
-        for _ in range(times):
-            crash_sound.play()
-            pygame.time.wait(300)
-
-# === Main Game Function ===
-
-def main():
-    pygame.init()
-    pygame.mixer.init()
+        audio.play(crash_sound, repeats=random.randint(2, 3), interval_ms=300)
 
-    # Load sounds.
-    try:
-        chirp_sound = pygame.mixer.Sound("chirp.wav")
-    except pygame.error:
-        print("Could not load chirp.wav. Please ensure it is in the same folder.")
-        chirp_sound = None
+def plan_move(model, obs, current_direction, snake_length, rng=random):
+    """
+    DQN player: return the direction of the next move for observation obs.
+    """
+    if model is not None:
+        action = model.predict(obs)
+    else:
+        # Fallback: choose a random valid action.
+        action = rng.choice([0, 1, 2, 3])
+    new_direction = ACTION_TO_DIRECTION[action]
+
+    # Prevent immediate reversal if the snake has more than one segment.
+    if snake_length > 1 and new_direction == OPPOSITE_DIRECTION[current_direction]:
+        new_direction = current_direction
+    return new_direction
 
-    try:
-        crash_sound = pygame.mixer.Sound("crash.wav")
-    except pygame.error:
-        print("Could not load crash.wav. Please ensure it is in the same folder.")
-        crash_sound = None
+# === Main Game Function ===
 
-    # Load the pre-trained DQN model.
+def main(headless=False, uncapped=False, trap_ticks=FPS, max_steps=None,
+         backend="numpy", model_path=None, pipelined=False, planner_deadline_ms=PLANNER_DEADLINE_MS,
+         mute=False, stall_steps=None, seed=None):
+    chirp_sound = trap_sound = game_over_sound = None
+    audio = AudioManager(muted=True)
+    if not headless:
+        pygame.init()
+        pygame.mixer.init()
+        audio = AudioManager(muted=mute)  # Sounds play on reserved channels, never blocking.
+
+        # Sound effects are synthesized in memory (snake_sounds.py), no WAV files needed.
+        chirp_sound = make_sound("chirp")
+        trap_sound = make_sound("trap")
+        game_over_sound = make_sound("game_over")
+
+    # Load the pre-trained DQN model (see snake_policy.py for the backends).
     try:
-        model = DQN.load("dqn_snake_model")
-        print("DQN model loaded successfully.")
+        model = load_policy(backend, model_path)
+        print("DQN model loaded successfully ({} backend).".format(backend))
     except Exception as e:
         print("Error loading DQN model:", e)
         model = None
 
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption("AI Snake Game with DQN")
-    clock = pygame.time.Clock()
+    if not headless:
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("AI Snake Game with DQN")
+        font = pygame.font.SysFont("Arial", 24)  # Created once, not every frame.
+        renderer = BoardRenderer(screen, GRID_WIDTH, GRID_HEIGHT, CELL_SIZE, BLACK, WHITE,
+                                 font=font, text_color=WHITE)
+    clock = GameClock(FPS, fixed_tick=headless or uncapped, uncapped=uncapped, trap_ticks=trap_ticks,
+                      stall_steps=stall_steps)
 
     # Initialize snake: start with 3 segments.
-    snake = [
+    snake = SnakeBody([
         (GRID_WIDTH // 2, GRID_HEIGHT // 2),
         (GRID_WIDTH // 2 - 1, GRID_HEIGHT // 2),
         (GRID_WIDTH // 2 - 2, GRID_HEIGHT // 2)
-    ]
+    ], GRID_WIDTH, GRID_HEIGHT)
     current_direction = (1, 0)  # Initially moving right.
 
+    # Free cells (not snake, trap or apple) for O(1) apple and trap placement.
+    # The game's own random numbers, apart from the sounds, so a seed replays the same game.
+    rng = random.Random(seed)
+    free_cells = FreeCells(GRID_WIDTH, GRID_HEIGHT)
+    for cell in snake:
+        free_cells.remove(cell)
+
     # Place the first apple.
-    occupied = set(snake)
-    apple = get_random_free_position(occupied)
-    apple_color = random.choice(APPLE_COLORS)
+    apple = get_random_free_position(free_cells, rng)
+    apple_color = rng.choice(APPLE_COLORS)
 
     # Initialize traps.
     traps = []
-    trap_interval = 1000  # Add one trap every 1000 ms (1 second).
-    last_trap_time = pygame.time.get_ticks()
+    trap_cells = set()  # Same cells as traps, for O(1) collision checks.
+
+    # Build the observation grid once; below only the changed cells are updated.
+    obs = get_observation(snake, apple, traps)
+
+    # Cells whose colour changed since the last frame; only these are repainted.
+    changed = list(snake) + [apple]
+
+    # With pipelining the next move is planned on a background thread.
+    planner = None
+    planner_deadline = planner_deadline_ms / 1000.0
+    if pipelined:
+        planner = BackgroundPlanner(functools.partial(plan_move, model, rng=rng))
+        planner.submit(obs.copy(), current_direction, len(snake))
 
     score = 0
     running = True
 
     while running:
-        clock.tick(FPS)
-        current_time = pygame.time.get_ticks()
+        clock.tick()
+        audio.update()
+        if headless:
+            changed = []
 
         # Process events.
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.VIDEOEXPOSE:
+                    renderer.invalidate()
 
         # Add a new trap every second.
-        if current_time - last_trap_time >= trap_interval:
-            occupied_for_trap = set(snake) | set(traps) | {apple}
-            new_trap = get_random_free_position(occupied_for_trap)
-            traps.append(new_trap)
-            last_trap_time = current_time
+        new_trap = None
+        if clock.trap_due():
+            new_trap = get_random_free_position(free_cells, rng)
+            if new_trap is not None:  # No trap when the board is full.
+                traps.append(new_trap)
+                trap_cells.add(new_trap)
+                obs[new_trap[1], new_trap[0]] = 3
+                changed.append(new_trap)
 
         # --- AI Decision Making using DQN ---
-        obs = get_observation(snake, apple, traps)
-        # Expand dimensions to add batch dimension (model expects shape: (1, height, width)).
-        if model is not None:
-            action, _ = model.predict(obs[None, ...], deterministic=True)
-            action = int(action)
+        if planner is None:
+            current_direction = plan_move(model, obs, current_direction, len(snake), rng)
         else:
-            # Fallback: choose a random valid action.
-            action = random.choice([0, 1, 2, 3])
-        new_direction = ACTION_TO_DIRECTION[action]
-
-        # Prevent immediate reversal if the snake has more than one segment.
-        if len(snake) > 1 and new_direction == OPPOSITE_DIRECTION[current_direction]:
-            new_direction = current_direction
-        current_direction = new_direction
+            # The planner thread worked on this move while the last frame was drawn.
+            planned = planner.next_move(planner_deadline)
+            if planned is None or (snake[0][0] + planned[0], snake[0][1] + planned[1]) == new_trap:
+                # Late, or the trap added this frame is in the way: take the last safe move.
+                planned = safe_move(snake, current_direction, trap_cells, GRID_WIDTH, GRID_HEIGHT)
+            current_direction = planned
 
         # --- Move the Snake ---
         head_x, head_y = snake[0]
@@ -177,61 +247,89 @@ def main():
         # Check for collision with walls.
         if (new_head[0] < 0 or new_head[0] >= GRID_WIDTH or
             new_head[1] < 0 or new_head[1] >= GRID_HEIGHT):
-            play_crash_sound(crash_sound)
+            play_crash_sound(audio, game_over_sound)
             print("Game over! Final score:", score)
             running = False
             continue
 
         # Check for collision with itself.
         if new_head in snake:
-            play_crash_sound(crash_sound)
+            play_crash_sound(audio, game_over_sound)
             print("Game over! Final score:", score)
             running = False
             continue
 
         # If the snake eats the apple.
         if new_head == apple:
-            snake.insert(0, new_head)  # Grow the snake.
+            clock.progress()
+            snake.push_head(new_head)  # Grow the snake.
+            mark_snake(obs, new_head)
             apple_reward = 10 + len(snake) + len(traps)
             score += apple_reward
-            if chirp_sound:
-                chirp_sound.play()
+            audio.play(chirp_sound)
             # Place a new apple (avoid snake and traps) with a random color.
-            occupied = set(snake) | set(traps)
-            apple = get_random_free_position(occupied)
-            apple_color = random.choice(APPLE_COLORS)
+            apple = get_random_free_position(free_cells, rng)
+            if apple is None:
+                print("Board full! Final score:", score)
+                running = False
+                continue
+            apple_color = rng.choice(APPLE_COLORS)
+            obs[apple[1], apple[0]] = 2
+            changed.append(apple)
         # If the snake hits a trap.
-        elif new_head in traps:
-            snake.insert(0, new_head)
+        elif new_head in trap_cells:
+            snake.push_head(new_head)
             new_length = max(1, len(snake) // 2)
-            snake = snake[:new_length]
+            removed = snake.truncate(new_length)
+            for cell in removed:
+                clear_snake(obs, cell)
+            release_cells(free_cells, removed, trap_cells)
+            changed.extend(removed)
             score -= 10
-            play_crash_sound(crash_sound)
+            play_crash_sound(audio, trap_sound)
         else:
             # Normal move: add new head and remove tail.
-            snake.insert(0, new_head)
-            snake.pop()
+            snake.push_head(new_head)
+            free_cells.remove(new_head)
+            mark_snake(obs, new_head)
+            tail = snake.pop_tail()
+            clear_snake(obs, tail)
+            release_cells(free_cells, [tail], trap_cells)
+            changed.append(tail)
+        changed.append(new_head)
+
+        if planner is not None:
+            planner.submit(obs.copy(), current_direction, len(snake))
+
+        if max_steps is not None and clock.ticks >= max_steps:
+            print("Step limit reached! Final score:", score)
+            running = False
+        elif clock.stalled():
+            print("No apple for", clock.stall_steps, "steps! Final score:", score)
+            running = False
+        if headless:
+            continue
 
         # --- Rendering ---
-        screen.fill(BLACK)
-        draw_grid(screen)
-        # Draw the apple.
-        ax, ay = apple
-        pygame.draw.rect(screen, apple_color, (ax * CELL_SIZE, ay * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw traps.
-        for (tx, ty) in traps:
-            pygame.draw.rect(screen, PURPLE, (tx * CELL_SIZE, ty * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw the snake.
-        for (sx, sy) in snake:
-            pygame.draw.rect(screen, GREEN, (sx * CELL_SIZE, sy * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw the score.
-        font = pygame.font.SysFont("Arial", 24)
-        score_text = font.render("Score: " + str(score), True, WHITE)
-        screen.blit(score_text, (10, 10))
-        pygame.display.update()
-
+        # Only the cells that changed this frame are repainted.
+        renderer.draw_changes({cell: cell_color(cell, snake, trap_cells, apple, apple_color)
+                               for cell in changed}, "Score: " + str(score))
+        changed = []
+
+    clock.report()
+    audio.finish()
+    if planner is not None:
+        print("Planner moves that missed the deadline:", planner.missed)
+        planner.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    parser = game_arg_parser("AI Snake Game with DQN.", FPS)
+    add_backend_argument(parser)
+    add_planner_arguments(parser)
+    add_audio_arguments(parser)
+    args = parser.parse_args()
+    main(args.headless, args.uncapped, args.trap_ticks, args.max_steps, args.backend, args.model,
+         args.pipelined, args.planner_deadline, args.mute, stall_steps=args.stall_steps,
+         seed=args.seed)
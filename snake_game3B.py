@@ -1,7 +1,15 @@
 import pygame
 import random
 import sys
-from collections import deque
+
+from snake_body import SnakeBody
+from snake_free_cells import FreeCells
+from snake_bitboard_bfs import bfs  # Bitboard BFS, same paths as the dict-based version.
+from snake_headless import GameClock, game_arg_parser
+from snake_audio import AudioManager, add_audio_arguments
+from snake_renderer import BoardRenderer
+from snake_sounds import make_sound
+from snake_planner import PLANNER_DEADLINE_MS, BackgroundPlanner, add_planner_arguments, safe_move
 
 # === Configuration Constants ===
 CELL_SIZE    = 20
@@ -35,47 +43,30 @@ RIGHT = (1,  0)
 
 # === Helper Functions ===
 
-def get_random_free_position(occupied):
+def get_random_free_position(free_cells, rng):
     """
-    Return a random grid cell (x, y) that is not in the occupied set.
+    Return a random free grid cell (x, y) and mark it occupied.
+    Returns None if the board is full.
     """
-    while True:
-        pos = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-        if pos not in occupied:
-            return pos
+    pos = free_cells.sample(rng)
+    if pos is not None:
+        free_cells.remove(pos)
+    return pos
 
-def bfs(start, target, snake, traps):
-    """
-    Uses Breadth-First Search (BFS) to find a path from start to target.
-    The snake’s body (all segments, including the tail) and traps are considered obstacles.
-    
-    Returns:
-        A list of grid positions (cells) representing the shortest path from start
-        to target (excluding the start cell). Returns None if no path is found.
-    """
-    obstacles = set(snake) | set(traps)
-    queue = deque([start])
-    came_from = {start: None}
-
-    while queue:
-        current = queue.popleft()
-        if current == target:
-            # Reconstruct the path from target back to start.
-            path = []
-            while current != start:
-                path.append(current)
-                current = came_from[current]
-            path.reverse()
-            return path
-
-        for d in [UP, DOWN, LEFT, RIGHT]:
-            next_cell = (current[0] + d[0], current[1] + d[1])
-            if (0 <= next_cell[0] < GRID_WIDTH and
-                0 <= next_cell[1] < GRID_HEIGHT and
-                next_cell not in came_from and
-                next_cell not in obstacles):
-                came_from[next_cell] = current
-                queue.append(next_cell)
+def release_cells(free_cells, cells, trap_cells):
+    """Return vacated snake cells to the free set (a cell under a trap stays occupied)."""
+    for cell in cells:
+        if cell not in trap_cells:
+            free_cells.add(cell)
+
+def cell_color(cell, snake, trap_cells, fruit_pos, fruit_color):
+    """Colour of a board cell (the snake drawn over traps over the apple), None if empty."""
+    if cell in snake:
+        return GREEN
+    if cell in trap_cells:
+        return PURPLE
+    if cell == fruit_pos:
+        return fruit_color
     return None
 
 def get_direction(from_cell, to_cell):
@@ -84,109 +75,133 @@ def get_direction(from_cell, to_cell):
     """
     return (to_cell[0] - from_cell[0], to_cell[1] - from_cell[1])
 
-def draw_grid(surface):
+def play_crash_sound(audio, crash_sound):
     """
-    Draw grid lines on the surface for visual effect.
+    Plays the crash sound 2-3 times, 300 ms apart, without pausing the game.
     """
-    for x in range(0, WINDOW_WIDTH, CELL_SIZE):
-        pygame.draw.line(surface, WHITE, (x, 0), (x, WINDOW_HEIGHT))
-    for y in range(0, WINDOW_HEIGHT, CELL_SIZE):
-        pygame.draw.line(surface, WHITE, (0, y), (WINDOW_WIDTH, y))
+    if crash_sound:
+        audio.play(crash_sound, repeats=random.randint(2, 3), interval_ms=300)
 
-def play_crash_sound(crash_sound):
+def plan_move(snake, direction, fruit_pos, traps, trap_cells):
     """
-    Plays the crash sound 2-3 times consecutively with a short delay.
+    BFS player: return the direction of the next move.
     """
-    if crash_sound:
-        times = random.randint(2, 3)
-        for _ in range(times):
-            crash_sound.play()
-            # Delay to allow the sound to finish (adjust as needed)
-            pygame.time.wait(300)
+    # Prioritize following a direct path to the apple.
+    path_to_fruit = bfs(snake[0], fruit_pos, snake, traps)
+    if path_to_fruit is not None:
+        next_cell = path_to_fruit[0]
+        return get_direction(snake[0], next_cell)
+    # If no direct path exists, try following the tail.
+    path_to_tail = bfs(snake[0], snake[-1], snake, traps)
+    if path_to_tail:
+        next_cell = path_to_tail[0]
+        return get_direction(snake[0], next_cell)
+    # As a last resort, choose any valid move.
+    for d in [UP, DOWN, LEFT, RIGHT]:
+        next_cell = (snake[0][0] + d[0], snake[0][1] + d[1])
+        if (0 <= next_cell[0] < GRID_WIDTH and
+            0 <= next_cell[1] < GRID_HEIGHT and
+            next_cell not in snake and
+            next_cell not in trap_cells):
+            return d
+    return direction
 
 # === Main Game Loop ===
 
-def main():
-    pygame.init()
-    pygame.mixer.init()
-
-      # Load sounds.
-    try:
-        chirp_sound = pygame.mixer.Sound("chirp.wav")
-    except pygame.error:
-        print("Could not load chirp.wav. Please ensure it is in the same folder as this script.")
-        chirp_sound = None
+def main(headless=False, uncapped=False, trap_ticks=FPS, max_steps=None,
+         pipelined=False, planner_deadline_ms=PLANNER_DEADLINE_MS, mute=False, stall_steps=None,
+         seed=None):
+    chirp_sound = trap_sound = game_over_sound = None
+    audio = AudioManager(muted=True)
+    if not headless:
+        pygame.init()
+        pygame.mixer.init()
+        audio = AudioManager(muted=mute)  # Sounds play on reserved channels, never blocking.
 
-    try:
-        crash_sound = pygame.mixer.Sound("crash.wav")
-    except pygame.error:
-        print("Could not load crash.wav. Please ensure it is in the same folder as this script.")
-        crash_sound = None
+        # Sound effects are synthesized in memory (snake_sounds.py), no WAV files needed.
+        chirp_sound = make_sound("chirp")
+        trap_sound = make_sound("trap")
+        game_over_sound = make_sound("game_over")
 
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption("AI Snake Game with Traps, Scoring & Random Apple Colors")
-    clock = pygame.time.Clock()
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("AI Snake Game with Traps, Scoring & Random Apple Colors")
+    clock = GameClock(FPS, fixed_tick=headless or uncapped, uncapped=uncapped, trap_ticks=trap_ticks,
+                      stall_steps=stall_steps)
 
     # Initialize score and font.
     score = 0
-    font = pygame.font.SysFont("Arial", 24)
+    font = None if headless else pygame.font.SysFont("Arial", 24)
+    if not headless:
+        renderer = BoardRenderer(screen, GRID_WIDTH, GRID_HEIGHT, CELL_SIZE, BLACK, WHITE,
+                                 grid_on_top=True, font=font, text_color=WHITE)
 
     # Initialize snake: starting with 3 segments.
-    snake = [
+    snake = SnakeBody([
         (GRID_WIDTH // 2, GRID_HEIGHT // 2),
         (GRID_WIDTH // 2 - 1, GRID_HEIGHT // 2),
         (GRID_WIDTH // 2 - 2, GRID_HEIGHT // 2)
-    ]
+    ], GRID_WIDTH, GRID_HEIGHT)
     direction = RIGHT
 
     # Initialize traps list (each trap is a grid cell that remains on the board)
     traps = []
-    last_trap_time = pygame.time.get_ticks()
+    trap_cells = set()  # Same cells as traps, for O(1) collision checks.
+
+    # Free cells (not snake, trap or apple) for O(1) apple and trap placement.
+    # The game's own random numbers, apart from the sounds, so a seed replays the same game.
+    rng = random.Random(seed)
+    free_cells = FreeCells(GRID_WIDTH, GRID_HEIGHT)
+    for cell in snake:
+        free_cells.remove(cell)
 
     # Place the first apple (avoid snake and traps)
-    occupied_for_fruit = set(snake) | set(traps)
-    fruit_pos = get_random_free_position(occupied_for_fruit)
-    fruit_color = random.choice(APPLE_COLORS)
+    fruit_pos = get_random_free_position(free_cells, rng)
+    fruit_color = rng.choice(APPLE_COLORS)
+
+    # Cells whose colour changed since the last frame; only these are repainted.
+    changed = list(snake) + [fruit_pos]
+
+    # With pipelining the next move is planned on a background thread.
+    planner = None
+    planner_deadline = planner_deadline_ms / 1000.0
+    if pipelined:
+        planner = BackgroundPlanner(plan_move)
+        planner.submit(snake.copy(), direction, fruit_pos, list(traps), set(trap_cells))
 
     running = True
     while running:
-        clock.tick(FPS)
-        current_time = pygame.time.get_ticks()
+        clock.tick()
+        audio.update()
+        if headless:
+            changed = []
 
         # Add a new trap every 1 second.
-        if current_time - last_trap_time >= 1000:
-            occupied_for_trap = set(snake) | set(traps) | {fruit_pos}
-            new_trap = get_random_free_position(occupied_for_trap)
-            traps.append(new_trap)
-            last_trap_time = current_time
+        new_trap = None
+        if clock.trap_due():
+            new_trap = get_random_free_position(free_cells, rng)
+            if new_trap is not None:  # No trap when the board is full.
+                traps.append(new_trap)
+                trap_cells.add(new_trap)
+                changed.append(new_trap)
 
         # Process events.
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.VIDEOEXPOSE:
+                    renderer.invalidate()
 
          # AI usinBFS Algorithm
-        # Prioritize following a direct path to the apple.
-        path_to_fruit = bfs(snake[0], fruit_pos, snake, traps)
-        if path_to_fruit is not None:
-            next_cell = path_to_fruit[0]
-            direction = get_direction(snake[0], next_cell)
+        if planner is None:
+            direction = plan_move(snake, direction, fruit_pos, traps, trap_cells)
         else:
-            # If no direct path exists, try following the tail.
-            path_to_tail = bfs(snake[0], snake[-1], snake, traps)
-            if path_to_tail is not None:
-                next_cell = path_to_tail[0]
-                direction = get_direction(snake[0], next_cell)
-            else:
-                # As a last resort, choose any valid move.
-                for d in [UP, DOWN, LEFT, RIGHT]:
-                    next_cell = (snake[0][0] + d[0], snake[0][1] + d[1])
-                    if (0 <= next_cell[0] < GRID_WIDTH and
-                        0 <= next_cell[1] < GRID_HEIGHT and
-                        next_cell not in snake and
-                        next_cell not in traps):
-                        direction = d
-                        break
+            # The planner thread worked on this move while the last frame was drawn.
+            planned = planner.next_move(planner_deadline)
+            if planned is None or (snake[0][0] + planned[0], snake[0][1] + planned[1]) == new_trap:
+                # Late, or the trap added this frame is in the way: take the last safe move.
+                planned = safe_move(snake, direction, trap_cells, GRID_WIDTH, GRID_HEIGHT)
+            direction = planned
 
         # ===== MOVE THE SNAKE =====
         new_head = (snake[0][0] + direction[0], snake[0][1] + direction[1])
@@ -195,57 +210,79 @@ def main():
         if (new_head[0] < 0 or new_head[0] >= GRID_WIDTH or
             new_head[1] < 0 or new_head[1] >= GRID_HEIGHT or
             new_head in snake):
-            play_crash_sound(crash_sound)
+            play_crash_sound(audio, game_over_sound)
             print("Game over! Final score:", score)
             running = False
             continue
 
         # If the snake hits a trap, play crash sound, then cut its length to half.
-        elif new_head in traps:
-            play_crash_sound(crash_sound)
-            snake.insert(0, new_head)
+        elif new_head in trap_cells:
+            play_crash_sound(audio, trap_sound)
+            snake.push_head(new_head)
             new_length = max(1, len(snake) // 2)
-            snake = snake[:new_length]
+            removed = snake.truncate(new_length)
+            release_cells(free_cells, removed, trap_cells)
+            changed.extend(removed)
             print("Hit trap! Snake length cut to half. New length:", len(snake))
         
         # If the snake eats the apple.
         elif new_head == fruit_pos:
-            snake.insert(0, new_head)
-            if chirp_sound:
-                chirp_sound.play()
+            clock.progress()
+            snake.push_head(new_head)
+            audio.play(chirp_sound)
             # Increase score based on snake length and number of traps.
             # (The harder it is, the higher the reward.)
             apple_reward = 10 + len(snake) + len(traps)
             score += apple_reward
             print("Apple eaten! Score increased by", apple_reward, "New score:", score)
             # Place a new apple (avoid snake and traps), with a random color.
-            occupied_for_fruit = set(snake) | set(traps)
-            fruit_pos = get_random_free_position(occupied_for_fruit)
-            fruit_color = random.choice(APPLE_COLORS)
+            fruit_pos = get_random_free_position(free_cells, rng)
+            if fruit_pos is None:
+                print("Board full! Final score:", score)
+                running = False
+                continue
+            fruit_color = rng.choice(APPLE_COLORS)
+            changed.append(fruit_pos)
         else:
             # Normal move.
-            snake.insert(0, new_head)
-            snake.pop()
+            snake.push_head(new_head)
+            free_cells.remove(new_head)
+            tail = snake.pop_tail()
+            release_cells(free_cells, [tail], trap_cells)
+            changed.append(tail)
+        changed.append(new_head)
+
+        if planner is not None:
+            planner.submit(snake.copy(), direction, fruit_pos, list(traps), set(trap_cells))
+
+        if max_steps is not None and clock.ticks >= max_steps:
+            print("Step limit reached! Final score:", score)
+            running = False
+        elif clock.stalled():
+            print("No apple for", clock.stall_steps, "steps! Final score:", score)
+            running = False
+        if headless:
+            continue
 
         # ===== DRAWING =====
-        screen.fill(BLACK)
-        # Draw the apple.
-        pygame.draw.rect(screen, fruit_color, (fruit_pos[0] * CELL_SIZE, fruit_pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw the traps.
-        for trap in traps:
-            pygame.draw.rect(screen, PURPLE, (trap[0] * CELL_SIZE, trap[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw the snake.
-        for segment in snake:
-            pygame.draw.rect(screen, GREEN, (segment[0] * CELL_SIZE, segment[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-        # Draw grid lines.
-        draw_grid(screen)
-        # Draw the score.
-        score_text = font.render("Score: " + str(score), True, WHITE)
-        screen.blit(score_text, (10, 10))
-        pygame.display.update()
+        # Only the cells that changed this frame are repainted, with the grid lines over them.
+        renderer.draw_changes({cell: cell_color(cell, snake, trap_cells, fruit_pos, fruit_color)
+                               for cell in changed}, "Score: " + str(score))
+        changed = []
 
+    clock.report()
+    audio.finish()
+    if planner is not None:
+        print("Planner moves that missed the deadline:", planner.missed)
+        planner.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    parser = game_arg_parser("AI Snake Game with Traps, Scoring and Random Apple Colors (BFS player).", FPS)
+    add_planner_arguments(parser)
+    add_audio_arguments(parser)
+    args = parser.parse_args()
+    main(args.headless, args.uncapped, args.trap_ticks, args.max_steps,
+         args.pipelined, args.planner_deadline, args.mute, stall_steps=args.stall_steps,
+         seed=args.seed)
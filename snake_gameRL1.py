@@ -1,8 +1,13 @@
 import gym
 import numpy as np
 import random
+from collections import namedtuple
 from gym import spaces
-import pygame
+
+from snake_bitboard_bfs import BitboardGrid
+from snake_body import SnakeBody
+from snake_free_cells import FreeCells
+from snake_raster import CODE_APPLE, CODE_SNAKE, Rasterizer
 
 # --- Global Constants ---
 GRID_WIDTH = 20
@@ -24,6 +29,9 @@ APPLE_COLORS = [
     (255, 0, 255)      # Magenta
 ]
 
+# Draws the frames of render() with NumPy (same pixels as drawing with pygame).
+RASTERIZER = Rasterizer(CELL_SIZE, COLOR_BG, COLOR_GRID, COLOR_SNAKE, COLOR_TRAP, APPLE_COLORS)
+
 # Map actions to directions.
 # 0: UP, 1: DOWN, 2: LEFT, 3: RIGHT
 ACTION_TO_DIRECTION = {
@@ -36,6 +44,17 @@ ACTION_TO_DIRECTION = {
 # Utility: Get the opposite action (to prevent immediate reversal)
 OPPOSITE_ACTION = {0:1, 1:0, 2:3, 3:2}
 
+# Everything needed to continue a game exactly: snake and traps as (x, y)
+# cells in order, apple (x, y) or None, free_cells as the flattened cell
+# indices in FreeCells order and rng_state from random.Random.getstate().
+SnakeState = namedtuple("SnakeState", "snake direction apple apple_color traps "
+                                      "steps_since_last_trap score done free_cells rng_state")
+
+# Observation modes: the whole grid, or the feature vector of _get_features().
+OBSERVATION_MODES = ("grid", "features")
+N_FEATURES = 19  # Feature vector length without the local window.
+WALL = 4         # Grid value of the border around the board (see padded_grid).
+
 
 # --- The Snake Environment ---
 class SnakeEnv(gym.Env):
@@ -54,81 +73,260 @@ class SnakeEnv(gym.Env):
         • -10 when hitting a trap (and the snake’s length is cut to half).
         • -0.1 per normal move.
         • -100 if the snake collides with the wall or itself (episode termination).
+        The episode also ends (info['board_full']) when no free cell is left for the apple.
+    Rendering:
+        Frames are rasterized from the grid with NumPy (snake_raster.py).
+        render('rgb_array') returns the frame as an RGB numpy array without
+        importing pygame; so does render() with headless=True, so training
+        workers need no display. Pygame is only imported and initialized on
+        the first render() call in 'human' mode.
+    Observations:
+        One persistent grid is updated cell by cell as the state changes.
+        step()/reset() hand out a copy of it, or with copy_observation=False
+        a read-only view that is only valid until the next step()/reset().
+        With observation="features" they hand out a float32 vector instead,
+        whose size doesn't depend on the grid size (see _get_features()):
+        death and trap ahead in each direction, apple offset and distance,
+        current direction, free area behind each move and, with window_size=K
+        (odd), the KxK cells around the head.
     """
     metadata = {'render.modes': ['human', 'rgb_array']}
 
-    def __init__(self):
+    def __init__(self, headless=False, copy_observation=True, seed=None, observation="grid", window_size=0):
         super(SnakeEnv, self).__init__()
         self.grid_width = GRID_WIDTH
         self.grid_height = GRID_HEIGHT
+        if observation not in OBSERVATION_MODES:
+            raise ValueError("Unknown observation mode: {!r}".format(observation))
+        if window_size < 0 or (window_size and window_size % 2 == 0):
+            raise ValueError("window_size must be an odd number of cells, got {}".format(window_size))
+        self.observation = observation
+        self.window_size = window_size
 
         # Define action and observation spaces.
         self.action_space = spaces.Discrete(4)  # 4 possible directions.
-        # Observation: grid with values in {0,1,2,3}
-        self.observation_space = spaces.Box(low=0, high=3,
-                                            shape=(self.grid_height, self.grid_width),
-                                            dtype=np.int8)
+        if observation == "grid":
+            # Observation: grid with values in {0,1,2,3}
+            self.observation_space = spaces.Box(low=0, high=3,
+                                                shape=(self.grid_height, self.grid_width),
+                                                dtype=np.int8)
+        else:
+            self.observation_space = spaces.Box(low=-1.0, high=1.0,
+                                                shape=(N_FEATURES + window_size * window_size,),
+                                                dtype=np.float32)
+
+        # Persistent observation grid, updated incrementally in step(). It is
+        # the inside of padded_grid, whose border of WALL cells lets the
+        # features look past the edges without bounds checks.
+        self.pad = max(1, window_size // 2)
+        self.padded_grid = np.full((self.grid_height + 2 * self.pad, self.grid_width + 2 * self.pad),
+                                   WALL, dtype=np.int8)
+        self.grid = self.padded_grid[self.pad:self.pad + self.grid_height, self.pad:self.pad + self.grid_width]
+        self.grid.fill(0)
+        self.copy_observation = copy_observation
+        self._grid_view = self.grid.view()
+        self._grid_view.setflags(write=False)
+
+        # Feature vector and flood-fill board for observation="features";
+        # blocked is the bitboard of the snake and trap cells, kept up to date
+        # with the grid.
+        self.blocked = 0
+        self.features = np.zeros(N_FEATURES + window_size * window_size, dtype=np.float32)
+        self._features_view = self.features.view()
+        self._features_view.setflags(write=False)
+        self.bitboard = BitboardGrid(self.grid_width, self.grid_height)
+
+        # Cells not covered by the snake, a trap or the apple.
+        self.free_cells = FreeCells(self.grid_width, self.grid_height)
 
         # How many steps between adding a new trap.
         self.trap_interval = 10  
         self.steps_since_last_trap = 0
 
-        # Pygame rendering attributes.
+        # Pygame rendering attributes (created lazily by render()).
+        self.headless = headless
         self.window = None
         self.clock = None
-        self._init_pygame()
 
+        # Private random number generator for apples, apple colors and traps.
+        self.seed(seed)
         self.reset()
 
+    def seed(self, seed=None):
+        """Seed the environment's random number generator."""
+        self.rng = random.Random(seed)
+        return [seed]
+
     def _init_pygame(self):
-        """Initialize Pygame for rendering."""
+        """Initialize Pygame and open the display window for 'human' rendering."""
+        import pygame
         pygame.init()
         self.window = pygame.display.set_mode((self.grid_width * CELL_SIZE,
                                                 self.grid_height * CELL_SIZE))
         pygame.display.set_caption("Snake RL Environment")
         self.clock = pygame.time.Clock()
 
-    def _get_random_free_position(self, occupied):
-        """Return a random (x,y) not in the occupied set."""
-        while True:
-            pos = (random.randint(0, self.grid_width - 1),
-                   random.randint(0, self.grid_height - 1))
-            if pos not in occupied:
-                return pos
+    def _get_random_free_position(self):
+        """Return a random free (x,y) and mark it occupied, or None if the board is full."""
+        pos = self.free_cells.sample(self.rng)
+        if pos is not None:
+            self.free_cells.remove(pos)
+        return pos
 
     def _get_observation(self):
-        """Return the current grid state as a numpy array."""
-        obs = np.zeros((self.grid_height, self.grid_width), dtype=np.int8)
-        # Mark snake segments as 1.
-        for (x, y) in self.snake:
-            obs[y, x] = 1
-        # Mark the apple as 2.
-        ax, ay = self.apple
-        obs[ay, ax] = 2
-        # Mark traps as 3.
-        for (x, y) in self.traps:
-            obs[y, x] = 3
-        return obs
+        """Return the current grid state (a copy, or a read-only view of the grid)."""
+        if self.observation == "features":
+            self._get_features()
+            if self.copy_observation:
+                return self.features.copy()
+            return self._features_view
+        if self.copy_observation:
+            return self.grid.copy()
+        return self._grid_view
+
+    def _get_features(self):
+        """
+        Fill self.features from the current state:
+            0-3    death (wall or snake) in the next cell UP, DOWN, LEFT, RIGHT
+            4-7    trap in the next cell UP, DOWN, LEFT, RIGHT
+            8-10   apple offset from the head (dx / width, dy / height) and
+                   Manhattan distance / (width + height)
+            11-14  current direction, one-hot
+            15-18  free cells reachable through the next cell UP, DOWN, LEFT,
+                   RIGHT, as a share of the snake's length and at most 1
+                   (1: room for the whole body, 0: the cell is blocked)
+            19-    with window_size=K, the KxK grid values around the head / WALL
+        The lookups read the incrementally updated padded_grid; only the
+        free-area counts need a (bitboard) flood fill per step, which stops
+        once the snake's length is reached.
+        """
+        features = self.features
+        grid = self.padded_grid
+        head_x, head_y = self.snake[0]
+        width, height = self.grid_width, self.grid_height
+        px, py = head_x + self.pad, head_y + self.pad
+
+        # Next cell in each direction, as Python ints (cheaper than NumPy scalars).
+        ahead = [grid.item(py + dy, px + dx) for (dx, dy) in ACTION_TO_DIRECTION.values()]
+        death = []
+        trap = []
+        for value, (dx, dy) in zip(ahead, ACTION_TO_DIRECTION.values()):
+            if value == 3:
+                # A trap stays coded 3 under a body segment, and that move is fatal.
+                on_body = (head_x + dx, head_y + dy) in self.snake
+                death.append(float(on_body))
+                trap.append(float(not on_body))
+            else:
+                death.append(float(value == 1 or value == WALL))
+                trap.append(0.0)
+
+        free = self.bitboard.full & ~self.blocked
+        length = len(self.snake)
+        areas = []
+        regions = {}  # Flood-filled region -> its size, shared by moves into the same region.
+        for value, (dx, dy) in zip(ahead, ACTION_TO_DIRECTION.values()):
+            area = 0
+            if value == 0 or value == 2:
+                start = 1 << ((head_y + dy) * width + head_x + dx)
+                for region, size in regions.items():
+                    if region & start:
+                        area = size
+                        break
+                else:
+                    region, area = self.bitboard.flood_fill(start, free, length)
+                    regions[region] = area
+            areas.append(min(area, length) / float(length))
+
+        apple = [0.0, 0.0, 0.0]
+        if self.apple is not None:
+            dx, dy = self.apple[0] - head_x, self.apple[1] - head_y
+            apple = [dx / float(width), dy / float(height), (abs(dx) + abs(dy)) / float(width + height)]
+        direction = [0.0] * 4
+        direction[self._direction_to_action(self.current_direction)] = 1.0
+
+        features[:N_FEATURES] = death + trap + apple + direction + areas
+        if self.window_size:
+            half = self.window_size // 2
+            local = grid[py - half:py + half + 1, px - half:px + half + 1]
+            np.multiply(local.ravel(), 1.0 / WALL, out=features[N_FEATURES:], casting='unsafe')
+        return features
+
+    def _mark_snake(self, cell):
+        """Mark a snake segment on the grid (traps stay on top, as 3)."""
+        x, y = cell
+        if self.grid[y, x] != 3:
+            self.grid[y, x] = 1
+            self.free_cells.remove(cell)
+            self.blocked |= 1 << (y * self.grid_width + x)
+
+    def _clear_snake(self, cell):
+        """Clear a vacated snake segment (a trap underneath stays marked)."""
+        x, y = cell
+        if self.grid[y, x] == 1:
+            self.grid[y, x] = 0
+            self.free_cells.add(cell)
+            self.blocked &= ~(1 << (y * self.grid_width + x))
 
     def reset(self):
         """Reset the environment state and return the initial observation."""
         # Initialize snake at center with 3 segments.
         mid_x, mid_y = self.grid_width // 2, self.grid_height // 2
-        self.snake = [
+        self.snake = SnakeBody([
             (mid_x, mid_y),
             (mid_x - 1, mid_y),
             (mid_x - 2, mid_y)
-        ]
+        ], self.grid_width, self.grid_height)
         # Start moving to the right.
         self.current_direction = ACTION_TO_DIRECTION[3]
-        # Place the first apple.
-        occupied = set(self.snake)
-        self.apple = self._get_random_free_position(occupied)
-        self.apple_color = random.choice(APPLE_COLORS)
         self.traps = []
+        self.trap_cells = set()  # Same cells as self.traps, for O(1) lookups.
         self.steps_since_last_trap = 0
         self.score = 0
         self.done = False
+
+        # Paint the starting grid once; step() only updates changed cells.
+        self.grid.fill(0)
+        self.blocked = 0
+        self.free_cells.reset()
+        for cell in self.snake:
+            self._mark_snake(cell)
+        # Place the first apple.
+        self.apple = self._get_random_free_position()
+        self.apple_color = self.rng.choice(APPLE_COLORS)
+        ax, ay = self.apple
+        self.grid[ay, ax] = 2
+        return self._get_observation()
+
+    def get_state(self):
+        """Return a SnakeState snapshot of the game (set_state() continues from it)."""
+        return SnakeState(tuple(self.snake), self.current_direction, self.apple, self.apple_color,
+                          tuple(self.traps), self.steps_since_last_trap, self.score, self.done,
+                          tuple(self.free_cells.cells), self.rng.getstate())
+
+    def set_state(self, state):
+        """Restore a SnakeState: the game then continues exactly as it did from the snapshot."""
+        self.snake = SnakeBody(state.snake, self.grid_width, self.grid_height)
+        self.current_direction = state.direction
+        self.apple = state.apple
+        self.apple_color = state.apple_color
+        self.traps = list(state.traps)
+        self.trap_cells = set(self.traps)
+        self.steps_since_last_trap = state.steps_since_last_trap
+        self.score = state.score
+        self.done = state.done
+        self.free_cells.restore(state.free_cells)
+        self.rng.setstate(state.rng_state)
+
+        # Repaint the grid: traps stay on top of the snake, the apple is on a free cell.
+        self.grid.fill(0)
+        for (x, y) in self.snake:
+            self.grid[y, x] = 1
+        for (x, y) in self.traps:
+            self.grid[y, x] = 3
+        if self.apple is not None and self.apple not in self.snake:
+            ax, ay = self.apple
+            self.grid[ay, ax] = 2
+        self.blocked = self.bitboard.cells_to_bits(self.snake) | self.bitboard.cells_to_bits(self.traps)
         return self._get_observation()
 
     def step(self, action):
@@ -168,32 +366,43 @@ class SnakeEnv(gym.Env):
 
         # Apple eaten?
         if new_head == self.apple:
-            self.snake.insert(0, new_head)  # Grow snake.
+            self.snake.push_head(new_head)  # Grow snake.
+            self._mark_snake(new_head)
             apple_reward = 10 + len(self.snake) + len(self.traps)
             reward = apple_reward
             self.score += apple_reward
-            # Place a new apple.
-            occupied = set(self.snake) | set(self.traps)
-            self.apple = self._get_random_free_position(occupied)
-            self.apple_color = random.choice(APPLE_COLORS)
+            # Place a new apple; the episode ends if the board is full.
+            new_apple = self._get_random_free_position()
+            if new_apple is None:
+                self.done = True
+                return self._get_observation(), reward, self.done, {'board_full': True}
+            self.apple = new_apple
+            self.apple_color = self.rng.choice(APPLE_COLORS)
+            ax, ay = self.apple
+            self.grid[ay, ax] = 2
         # Hit a trap?
-        elif new_head in self.traps:
-            self.snake.insert(0, new_head)
+        elif new_head in self.trap_cells:
+            self.snake.push_head(new_head)
             # Cut snake length to half (minimum length 1).
             new_length = max(1, len(self.snake) // 2)
-            self.snake = self.snake[:new_length]
+            for cell in self.snake.truncate(new_length):
+                self._clear_snake(cell)
             reward = -10
         else:
             # Normal move: advance the snake.
-            self.snake.insert(0, new_head)
-            self.snake.pop()
+            self.snake.push_head(new_head)
+            self._mark_snake(new_head)
+            self._clear_snake(self.snake.pop_tail())
 
         # Update trap counter and add a trap if interval reached.
         self.steps_since_last_trap += 1
         if self.steps_since_last_trap >= self.trap_interval:
-            occupied = set(self.snake) | set(self.traps) | {self.apple}
-            new_trap = self._get_random_free_position(occupied)
-            self.traps.append(new_trap)
+            new_trap = self._get_random_free_position()
+            if new_trap is not None:  # No trap when the board is full.
+                self.traps.append(new_trap)
+                self.trap_cells.add(new_trap)
+                self.grid[new_trap[1], new_trap[0]] = 3
+                self.blocked |= self.bitboard.cell_bit(new_trap)
             self.steps_since_last_trap = 0
 
         return self._get_observation(), reward, self.done, {}
@@ -205,40 +414,54 @@ class SnakeEnv(gym.Env):
                 return action
         return 3  # Default to RIGHT.
 
-    def render(self, mode='human'):
-        """Render the current state using Pygame."""
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.close()
-
-        self.window.fill(COLOR_BG)
+    def cell_codes(self):
+        """
+        Return the (H, W) cell codes of the board for the Rasterizer: the grid,
+        with the snake on top of traps and the apple coded by its colour.
+        """
+        codes = self.grid.copy()
+        snake = np.frombuffer(self.snake.occupied, dtype=np.uint8).reshape(self.grid_height, self.grid_width)
+        codes[snake == 1] = CODE_SNAKE
+        if self.apple is not None and self.apple not in self.snake:
+            ax, ay = self.apple
+            codes[ay, ax] = CODE_APPLE + APPLE_COLORS.index(self.apple_color)
+        return codes
 
-        # Optionally draw grid lines.
-        for x in range(self.grid_width):
-            for y in range(self.grid_height):
-                rect = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                pygame.draw.rect(self.window, COLOR_GRID, rect, 1)
+    def render(self, mode='human'):
+        """
+        Render the current state.
+        'rgb_array' (and any mode when headless) returns a (H, W, 3) uint8 array;
+        'human' shows the same frame in a Pygame window.
+        """
+        frame = RASTERIZER.frame(self.cell_codes())
+        if mode == 'rgb_array' or self.headless:
+            return frame
 
-        # Draw traps.
-        for (x, y) in self.traps:
-            rect = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(self.window, COLOR_TRAP, rect)
+        import pygame
 
-        # Draw the apple.
-        ax, ay = self.apple
-        rect = pygame.Rect(ax * CELL_SIZE, ay * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-        pygame.draw.rect(self.window, self.apple_color, rect)
+        if self.window is None:
+            self._init_pygame()
 
-        # Draw the snake.
-        for (x, y) in self.snake:
-            rect = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(self.window, COLOR_SNAKE, rect)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.close()
+                return
 
+        pygame.surfarray.blit_array(self.window, frame.transpose(1, 0, 2))
         pygame.display.flip()
         self.clock.tick(10)  # Limit to 10 FPS.
 
     def close(self):
-        pygame.quit()
+        if self.window is not None:
+            import pygame
+            pygame.quit()
+            self.window = None
+            self.clock = None
+
+
+def render_tiled(envs, columns=None):
+    """Return one RGB frame with the boards of several SnakeEnvs in rows and columns."""
+    return RASTERIZER.tiled(np.stack([env.cell_codes() for env in envs]), columns)
 
 
 # --- Training the RL Agent ---
@@ -248,6 +471,16 @@ class SnakeEnv(gym.Env):
 # The training loop is handled by the library’s .learn() method.
 #
 if __name__ == "__main__":
+    import argparse
+
+    import pygame
+
+    parser = argparse.ArgumentParser(description="Train the Snake DQN, then watch one game.")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="train a PrioritizedDQN (prioritized experience replay, "
+                             "as snake_train_dqn.py --prioritized)")
+    args = parser.parse_args()
+
     # Create the environment.
     env = SnakeEnv()
 
@@ -255,8 +488,12 @@ if __name__ == "__main__":
     # from stable_baselines3.common.env_checker import check_env
     # check_env(env, warn=True)
 
-    # Import DQN from stable_baselines3.
-    from stable_baselines3 import DQN
+    # Import DQN from stable_baselines3, or with --prioritized our PrioritizedDQN
+    # (a DQN that samples its packed replay buffer by TD error).
+    if args.prioritized:
+        from snake_prioritized_replay import PrioritizedDQN as model_cls
+    else:
+        from stable_baselines3 import DQN as model_cls
 
     # Create the DQN model using a multilayer perceptron (MLP) policy.
     # model = DQN("MlpPolicy", env, verbose=1)   
@@ -264,7 +501,7 @@ if __name__ == "__main__":
     #    remember to start the log before your model learns to log all training metrics
     #    then in a terminal run the ff. command while opening a browser to view the tensorboard
     #           tensorboard --logdir ./dqn_tensorboard/
-    model = DQN("MlpPolicy", env, verbose=1,tensorboard_log="./dqn_tensorboard/")
+    model = model_cls("MlpPolicy", env, verbose=1,tensorboard_log="./dqn_tensorboard/")
     # Train the model for a specified number of timesteps.
     total_timesteps = 100000  # Adjust as needed.
     model.learn(total_timesteps=total_timesteps)
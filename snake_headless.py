@@ -0,0 +1,107 @@
+import argparse
+import time
+
+import pygame
+
+# Limits of --headless games when --max-steps / --stall-steps aren't given:
+# nobody is there to close the window, and a short snake can loop between
+# traps forever without reaching the apple.
+HEADLESS_MAX_STEPS   = 100000
+HEADLESS_STALL_STEPS = 5000
+
+
+class GameArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser that fills in the step limits once the mode is known."""
+
+    def parse_known_args(self, args=None, namespace=None):
+        args, extras = super(GameArgumentParser, self).parse_known_args(args, namespace)
+        for name, headless_default in (("max_steps", HEADLESS_MAX_STEPS), ("stall_steps", HEADLESS_STALL_STEPS)):
+            value = getattr(args, name)
+            if value is None and args.headless:
+                setattr(args, name, headless_default)
+            elif value == 0:
+                setattr(args, name, None)
+        return args, extras
+
+
+def game_arg_parser(description, fps):
+    """Argument parser with the command-line options shared by the pygame game scripts."""
+    parser = GameArgumentParser(description=description)
+    parser.add_argument("--headless", action="store_true",
+                        help="no window and no sound; traps follow the fixed logical tick")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="don't limit the frame rate, run as fast as the CPU allows "
+                             "(traps follow the fixed logical tick)")
+    parser.add_argument("--trap-ticks", type=int, default=fps,
+                        help="with a fixed tick, add a trap every K ticks "
+                             "(default: %(default)s, one per second of game time)")
+    parser.add_argument("--max-steps", type=int, default=None,
+                        help="end the game after this many steps (0: no limit; default: no limit, "
+                             "or {} with --headless)".format(HEADLESS_MAX_STEPS))
+    parser.add_argument("--stall-steps", type=int, default=None,
+                        help="end the game when no apple was eaten for this many steps (0: never; "
+                             "default: never, or {} with --headless)".format(HEADLESS_STALL_STEPS))
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed the game's random numbers (apples, colours, traps); the same seed "
+                             "replays the same game with --headless or --uncapped")
+    return parser
+
+
+def parse_game_args(description, fps):
+    """Parse the command-line options shared by the pygame game scripts."""
+    return game_arg_parser(description, fps).parse_args()
+
+
+class GameClock:
+    """
+    Paces a game loop and decides when the next trap is due.
+
+    Real time (default): clock.tick(fps) and a trap every trap_ms of wall-clock time.
+    Fixed tick (headless or uncapped): one logical tick per loop iteration and a trap
+    every trap_ticks ticks, so a game no longer depends on how fast the machine is.
+    With uncapped the loop is not throttled at all. With stall_steps, stalled()
+    tells when no progress() (an apple eaten) was made for that many ticks.
+    """
+
+    def __init__(self, fps, fixed_tick=False, uncapped=False, trap_ms=1000, trap_ticks=10, stall_steps=None):
+        self.fps = fps
+        self.fixed_tick = fixed_tick
+        self.uncapped = uncapped
+        self.trap_ms = trap_ms
+        self.trap_ticks = trap_ticks
+        self.clock = pygame.time.Clock()
+        self.ticks = 0
+        self.stall_steps = stall_steps
+        self.last_progress = 0
+        self.last_trap = 0 if fixed_tick else pygame.time.get_ticks()
+        self.start_time = time.perf_counter()
+
+    def tick(self):
+        """Advance one frame (waiting for the next frame unless uncapped)."""
+        if not self.uncapped:
+            self.clock.tick(self.fps)
+        self.ticks += 1
+
+    def trap_due(self):
+        """Return True (and restart the trap timer) when it is time to add a trap."""
+        if self.fixed_tick:
+            now, interval = self.ticks, self.trap_ticks
+        else:
+            now, interval = pygame.time.get_ticks(), self.trap_ms
+        if now - self.last_trap >= interval:
+            self.last_trap = now
+            return True
+        return False
+
+    def progress(self):
+        """Note that the game made progress (an apple was eaten) on this tick."""
+        self.last_progress = self.ticks
+
+    def stalled(self):
+        """Return True when stall_steps ticks passed without progress()."""
+        return self.stall_steps is not None and self.ticks - self.last_progress >= self.stall_steps
+
+    def report(self):
+        """Print the number of steps played and the steps per second."""
+        elapsed = time.perf_counter() - self.start_time
+        print("Steps: {}  Steps/sec: {:.0f}".format(self.ticks, self.ticks / max(elapsed, 1e-9)))
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+
+# Directions in the order the players try them.
+UP    = (0, -1)
+DOWN  = (0,  1)
+LEFT  = (-1, 0)
+RIGHT = (1,  0)
+
+PLANNER_DEADLINE_MS = 5  # How long the game loop waits for a late move before falling back.
+
+
+def put_latest(one_slot_queue, item):
+    """Put item into a queue of size 1, replacing an item nobody has taken yet."""
+    while True:
+        try:
+            one_slot_queue.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                one_slot_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class BackgroundPlanner:
+    """
+    Runs a player's plan function on a worker thread, so the next move is
+    computed while the game loop draws the current frame and waits for the
+    next one.
+
+    After each move the game loop calls submit(...) with a snapshot of the
+    new state (the planner must not see objects the loop keeps changing).
+    At the next frame next_move(deadline) returns plan(*snapshot), or None if
+    it isn't ready within deadline seconds. Requests and results go through
+    one-slot queues: a newer request replaces an unanswered one, and a result
+    that arrives after its frame has passed is thrown away.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.requests = queue.Queue(maxsize=1)
+        self.results = queue.Queue(maxsize=1)
+        self.request_id = 0
+        self.missed = 0  # Frames where the move wasn't ready in time.
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            request_id, state = request
+            put_latest(self.results, (request_id, self.plan(*state)))
+
+    def submit(self, *state):
+        """Start planning the move for state (replaces a request still waiting)."""
+        self.request_id += 1
+        put_latest(self.requests, (self.request_id, state))
+
+    def next_move(self, deadline):
+        """Return the move for the last submitted state, or None if it misses the deadline."""
+        end = time.perf_counter() + deadline
+        while True:
+            try:
+                request_id, move = self.results.get(timeout=max(0.0, end - time.perf_counter()))
+            except queue.Empty:
+                self.missed += 1
+                return None
+            if request_id == self.request_id:
+                return move
+
+    def close(self):
+        """Stop the worker thread."""
+        put_latest(self.requests, None)
+        self.thread.join(timeout=1.0)
+
+
+def is_free(cell, snake, trap_cells, grid_width, grid_height):
+    """True if cell is on the board and neither snake nor trap."""
+    return (0 <= cell[0] < grid_width and 0 <= cell[1] < grid_height and
+            cell not in snake and cell not in trap_cells)
+
+
+def safe_move(snake, direction, trap_cells, grid_width, grid_height):
+    """
+    Fallback move when the planner is late: keep going in direction if the cell
+    ahead is free, otherwise take the first free direction (UP, DOWN, LEFT,
+    RIGHT); keep direction if no neighbouring cell is free.
+    """
+    head_x, head_y = snake[0]
+    for d in [direction, UP, DOWN, LEFT, RIGHT]:
+        if is_free((head_x + d[0], head_y + d[1]), snake, trap_cells, grid_width, grid_height):
+            return d
+    return direction
+
+
+def add_planner_arguments(parser):
+    """Add the --pipelined and --planner-deadline options to a game's argument parser."""
+    parser.add_argument("--pipelined", action="store_true",
+                        help="plan the next move on a background thread while the frame is drawn")
+    parser.add_argument("--planner-deadline", type=float, default=PLANNER_DEADLINE_MS,
+                        help="with --pipelined, milliseconds to wait for a late move before "
+                             "falling back to a safe move (default: %(default)s)")
@@ -0,0 +1,344 @@
+import argparse
+import collections
+import io
+import os
+import pickle
+import time
+import zipfile
+
+import numpy as np
+
+# === Configuration Constants ===
+GRID_WIDTH  = 20
+GRID_HEIGHT = 20
+N_ACTIONS   = 4
+
+SB3_MODEL_PATH  = "dqn_snake_model"        # Stable-Baselines3 DQN (zip)
+ONNX_MODEL_PATH = "dqn_snake_model1.onnx"  # Same Q-network exported to ONNX
+NUMPY_MODEL_PATH = "dqn_snake_model.npz"   # q_net weights extracted from the zip
+
+BACKENDS = ("sb3", "onnx", "numpy")
+
+# NumPy dtypes of the typed storages found in PyTorch state dicts.
+TORCH_STORAGE_DTYPES = {
+    "FloatStorage":  np.float32,
+    "DoubleStorage": np.float64,
+    "HalfStorage":   np.float16,
+    "LongStorage":   np.int64,
+    "IntStorage":    np.int32,
+    "ShortStorage":  np.int16,
+    "CharStorage":   np.int8,
+    "ByteStorage":   np.uint8,
+    "BoolStorage":   np.bool_,
+}
+
+
+# --- Policy backends ---
+#
+# Every backend has the same interface: predict(obs) takes one (20, 20)
+# observation grid (0 = empty, 1 = snake, 2 = apple, 3 = trap) and returns the
+# greedy action as an int (0: UP, 1: DOWN, 2: LEFT, 3: RIGHT).
+# predict_batch(obs_batch) takes the observations of many boards as one
+# (n, 20, 20) array and returns their n actions, evaluating at most max_batch
+# boards per forward pass.
+#
+class SB3Policy:
+    """
+    The Stable-Baselines3 DQN model (imports PyTorch).
+    predict() goes through model.predict(); predict_batch() calls the Q-network
+    directly under torch.inference_mode(), with PyTorch pinned to `threads`
+    CPU threads (a process-wide setting).
+    """
+
+    def __init__(self, path=SB3_MODEL_PATH, max_batch=256, threads=1):
+        import torch
+        from stable_baselines3 import DQN
+        torch.set_num_threads(threads)
+        self.torch = torch
+        self.model = DQN.load(path, device="cpu")
+        self.q_net = self.model.q_net
+        self.q_net.set_training_mode(False)
+        self.max_batch = max_batch
+
+    def predict(self, obs):
+        action, _ = self.model.predict(obs, deterministic=True)
+        return int(action)
+
+    def predict_batch(self, obs_batch):
+        actions = np.empty(len(obs_batch), dtype=np.int64)
+        with self.torch.inference_mode():
+            for start in range(0, len(obs_batch), self.max_batch):
+                chunk = self.torch.as_tensor(obs_batch[start:start + self.max_batch])
+                actions[start:start + len(chunk)] = self.q_net(chunk).argmax(dim=1).numpy()
+        return actions
+
+
+class OnnxPolicy:
+    """
+    The exported Q-network run with ONNX Runtime on the CPU, without PyTorch.
+    The input buffer is allocated once and reused for every decision.
+    """
+
+    def __init__(self, path=ONNX_MODEL_PATH, max_batch=1, threads=1):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        # A 400-64-64-4 MLP is far too small to gain anything from more threads.
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        self.input = np.zeros((1, GRID_WIDTH * GRID_HEIGHT), dtype=np.float32)
+        self.max_batch = max_batch  # The exported graph has a fixed batch size of 1.
+
+    def q_values(self, obs):
+        """Return the 4 Q-values for one observation."""
+        self.input[0] = obs.reshape(-1)  # Cast to float32 in place.
+        return self.session.run([self.output_name], {self.input_name: self.input})[0][0]
+
+    def predict(self, obs):
+        return int(self.q_values(obs).argmax())
+
+    def predict_batch(self, obs_batch):
+        return np.array([self.q_values(obs).argmax() for obs in obs_batch], dtype=np.int64)
+
+
+class NumpyPolicy:
+    """
+    The Q-network (flatten -> Linear/ReLU -> Linear/ReLU -> Linear -> argmax)
+    evaluated with NumPy alone. The weights come from the .npz written by
+    export_npz() (python snake_policy.py --export); without it they are read
+    from the Stable-Baselines3 zip each time, and nothing is written.
+
+    The layer outputs go into float32 buffers allocated once for max_batch
+    boards, and bigger batches are evaluated max_batch at a time.
+    NumPy's BLAS picks its own thread count, so `threads` is not used.
+    """
+
+    def __init__(self, path=NUMPY_MODEL_PATH, max_batch=256, threads=1):
+        if os.path.exists(path):
+            with np.load(path) as data:
+                arrays = dict(data)
+        else:
+            print("{} not found: reading the weights from {}.zip "
+                  "(python snake_policy.py --export saves them)".format(path, SB3_MODEL_PATH))
+            arrays = q_net_arrays(SB3_MODEL_PATH + ".zip")
+        n_layers = len(arrays) // 2
+        # Stored as (out, in) like PyTorch; keep (in, out) so a layer is x @ W + b.
+        self.weights = [np.ascontiguousarray(arrays["w%d" % i].T, dtype=np.float32) for i in range(n_layers)]
+        self.biases = [arrays["b%d" % i].astype(np.float32) for i in range(n_layers)]
+        self.max_batch = max_batch
+        self.input = np.empty((max_batch, self.weights[0].shape[0]), dtype=np.float32)
+        self.buffers = [np.empty((max_batch, w.shape[1]), dtype=np.float32) for w in self.weights]
+        # 1-D buffers for predict(): a vector-matrix product has less overhead per layer.
+        self.vector_input = self.input[0]
+        self.vector_buffers = [np.empty(w.shape[1], dtype=np.float32) for w in self.weights]
+
+    def q_values_batch(self, obs_batch):
+        """
+        Return the Q-values of n <= max_batch observations as an (n, 4) array.
+        The result is a view of an internal buffer, overwritten by the next call.
+        """
+        n = len(obs_batch)
+        x = self.input[:n]
+        x[...] = obs_batch.reshape(n, -1)  # Cast to float32 in place.
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            h = self.buffers[i][:n]
+            np.matmul(x, w, out=h)
+            h += b
+            if i < last:
+                np.maximum(h, 0, out=h)
+            x = h
+        return x
+
+    def predict_batch(self, obs_batch):
+        """Return the greedy action of every observation in an (n, 20, 20) batch."""
+        actions = np.empty(len(obs_batch), dtype=np.int64)
+        for start in range(0, len(obs_batch), self.max_batch):
+            chunk = obs_batch[start:start + self.max_batch]
+            actions[start:start + len(chunk)] = self.q_values_batch(chunk).argmax(axis=1)
+        return actions
+
+    def q_values(self, obs):
+        """Return the 4 Q-values for one observation (a view of an internal buffer)."""
+        x = self.vector_input
+        x[...] = obs.reshape(-1)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            h = self.vector_buffers[i]
+            np.dot(x, w, out=h)
+            h += b
+            if i < last:
+                np.maximum(h, 0, out=h)
+            x = h
+        return x
+
+    def predict(self, obs):
+        return int(self.q_values(obs).argmax())
+
+
+def load_policy(backend="numpy", path=None, max_batch=256, threads=1):
+    """
+    Return the policy for backend ("sb3", "onnx" or "numpy"), from path or the
+    default model file. max_batch and threads configure predict_batch().
+    """
+    if backend == "sb3":
+        return SB3Policy(path or SB3_MODEL_PATH, max_batch, threads)
+    if backend == "onnx":
+        return OnnxPolicy(path or ONNX_MODEL_PATH, 1, threads)
+    if backend == "numpy":
+        return NumpyPolicy(path or NUMPY_MODEL_PATH, max_batch, threads)
+    raise ValueError("Unknown policy backend: {!r} (expected one of {})".format(backend, ", ".join(BACKENDS)))
+
+
+def add_backend_argument(parser):
+    """Add the --backend and --model options to a game's argument parser."""
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy",
+                        help="how the DQN policy is run: sb3 (PyTorch), onnx (ONNX Runtime) "
+                             "or numpy (NumPy only) (default: %(default)s)")
+    parser.add_argument("--model", default=None,
+                        help="model file (default: {} for sb3, {} for onnx, {} for numpy)".format(
+                            SB3_MODEL_PATH, ONNX_MODEL_PATH, NUMPY_MODEL_PATH))
+
+
+# --- Weight extraction ---
+#
+# policy.pth inside the Stable-Baselines3 zip is itself a zip written by
+# torch.save: archive/data.pkl pickles the state dict, and each tensor's raw
+# bytes are stored in archive/data/<key>. The unpickler below rebuilds the
+# tensors as NumPy arrays, so no PyTorch is needed to read the weights.
+#
+class StateDictUnpickler(pickle.Unpickler):
+    """Unpickle a torch.save()d state dict from an opened archive into NumPy arrays."""
+
+    def __init__(self, file, archive, prefix):
+        super(StateDictUnpickler, self).__init__(file)
+        self.archive = archive
+        self.prefix = prefix
+
+    def find_class(self, module, name):
+        if module == "collections" and name == "OrderedDict":
+            return collections.OrderedDict
+        if module == "torch._utils" and name == "_rebuild_tensor_v2":
+            return rebuild_tensor
+        if module == "torch" and name in TORCH_STORAGE_DTYPES:
+            return TORCH_STORAGE_DTYPES[name]
+        raise pickle.UnpicklingError("Unexpected object in state dict: {}.{}".format(module, name))
+
+    def persistent_load(self, pid):
+        _, dtype, key, _, numel = pid  # ("storage", storage type, key, location, numel)
+        data = self.archive.read("{}data/{}".format(self.prefix, key))
+        return np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder("<"), count=numel)
+
+
+def rebuild_tensor(storage, offset, size, stride, requires_grad=False, backward_hooks=None, metadata=None):
+    """NumPy stand-in for torch._utils._rebuild_tensor_v2 (strides are in elements)."""
+    strides = [s * storage.itemsize for s in stride]
+    return np.lib.stride_tricks.as_strided(storage[offset:], shape=size, strides=strides).copy()
+
+
+def read_state_dict(zip_path, member="policy.pth"):
+    """Return the state dict saved as member of a Stable-Baselines3 zip, as NumPy arrays."""
+    with zipfile.ZipFile(zip_path) as model_zip:
+        archive = zipfile.ZipFile(io.BytesIO(model_zip.read(member)))
+    pkl_name = next(name for name in archive.namelist() if name.endswith("data.pkl"))
+    prefix = pkl_name[:-len("data.pkl")]
+    return StateDictUnpickler(io.BytesIO(archive.read(pkl_name)), archive, prefix).load()
+
+
+def q_net_arrays(zip_path=SB3_MODEL_PATH + ".zip"):
+    """
+    Return the online Q-network layers (q_net.q_net.*, not the target network)
+    of a DQN zip as {"w0": ..., "b0": ..., "w1": ...}.
+    """
+    state_dict = read_state_dict(zip_path)
+    layers = sorted(int(key.split(".")[2]) for key in state_dict
+                    if key.startswith("q_net.q_net.") and key.endswith(".weight"))
+    arrays = {}
+    for i, layer in enumerate(layers):
+        arrays["w%d" % i] = state_dict["q_net.q_net.%d.weight" % layer].astype(np.float32)
+        arrays["b%d" % i] = state_dict["q_net.q_net.%d.bias" % layer].astype(np.float32)
+    return arrays
+
+
+def export_npz(zip_path=SB3_MODEL_PATH + ".zip", npz_path=NUMPY_MODEL_PATH):
+    """Save the Q-network layers of a DQN zip (see q_net_arrays()) in an .npz file."""
+    np.savez(npz_path, **q_net_arrays(zip_path))
+    return npz_path
+
+
+# === Parity check and benchmark ===
+#
+# Plays a few games to record real observations, checks that every backend
+# picks the same action as the Stable-Baselines3 model on each of them, and
+# prints the load time and the latency of one decision for each backend.
+#
+def record_observations(count, seed=0, epsilon=0.2):
+    """
+    Return count observations seen while playing SnakeEnv, as an (n, 20, 20) array.
+    The NumPy policy plays, with a random move epsilon of the time so games last.
+    """
+    from snake_gameRL1 import SnakeEnv
+    rng = np.random.default_rng(seed)
+    env = SnakeEnv(headless=True, seed=seed)
+    policy = NumpyPolicy()
+    observations = []
+    obs = env.reset()
+    while len(observations) < count:
+        observations.append(obs)
+        if rng.random() < epsilon:
+            action = int(rng.integers(N_ACTIONS))
+        else:
+            action = policy.predict(obs)
+        obs, _, done, _ = env.step(action)
+        if done:
+            obs = env.reset()
+    env.close()
+    return np.array(observations, dtype=np.int8)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the NumPy weights and compare the DQN policy backends.")
+    parser.add_argument("--export", action="store_true",
+                        help="(re)write {} from {}.zip and exit".format(NUMPY_MODEL_PATH, SB3_MODEL_PATH))
+    parser.add_argument("--boards", type=int, default=2000, help="number of observations to record")
+    parser.add_argument("--observations", default=None,
+                        help="use observations saved with np.save() instead of recording new ones")
+    args = parser.parse_args()
+
+    if args.export:
+        print("Saved", export_npz())
+        raise SystemExit
+
+    if args.observations:
+        observations = np.load(args.observations)
+    else:
+        observations = record_observations(args.boards)
+
+    reference = None
+    mismatches = 0
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        policy = load_policy(backend)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actions = [policy.predict(obs) for obs in observations]
+        decide_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_actions = policy.predict_batch(observations)
+        batch_time = time.perf_counter() - start
+
+        if reference is None:
+            reference = np.array(actions)
+        matches = int((np.array(actions) == reference).sum())
+        mismatches += len(observations) - matches + int((batch_actions != reference).sum())
+        print("{:>5}: load {:7.1f} ms  decision {:7.1f} us  batched {:6.2f} us/board  "
+              "same action as {}: {}/{}".format(
+                  backend, 1000 * load_time, 1e6 * decide_time / len(observations),
+                  1e6 * batch_time / len(observations), BACKENDS[0], matches, len(observations)))
+    if mismatches:
+        raise SystemExit("Parity check failed: {} actions differ from {}".format(mismatches, BACKENDS[0]))
@@ -0,0 +1,251 @@
+import collections
+import time
+
+import numpy as np
+import torch as th
+from torch.nn import functional as F
+from stable_baselines3 import DQN
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+
+from snake_replay_buffer import SnakeReplayBuffer
+
+PRIORITY_ALPHA = 0.6    # How strongly the priorities shape sampling (0: uniform).
+PRIORITY_BETA = 0.4     # Importance-sampling correction at the start, annealed to 1.
+PRIORITY_EPSILON = 1e-6  # Added to |TD error| so no transition becomes unsampleable.
+
+# ReplayBufferSamples plus the importance-sampling weights and the sampled
+# transitions' tree indices (to pass back to update_priorities()).
+PrioritizedReplayBufferSamples = collections.namedtuple(
+    "PrioritizedReplayBufferSamples", ReplayBufferSamples._fields + ("weights", "indices"))
+
+
+class PriorityTree:
+    """
+    Sum-tree and min-tree over `capacity` priorities, stored as flat arrays
+    (node i has children 2i and 2i + 1, the leaves start at `size`).
+
+    update() changes any number of leaves and then recomputes their ancestors
+    one level at a time, so a batch update is O(batch * log N) in a few NumPy
+    operations per level (update_range() does the same with slices for a run of
+    consecutive leaves). find() walks all the sampled prefix sums down the tree
+    together, one level per step.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.depth = self.size.bit_length() - 1
+        self.sums = np.zeros(2 * self.size, dtype=np.float64)
+        self.mins = np.full(2 * self.size, np.inf, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.sums[1]
+
+    @property
+    def min(self):
+        return self.mins[1]
+
+    def __getitem__(self, indices):
+        return self.sums[np.asarray(indices) + self.size]
+
+    def update(self, indices, priorities):
+        """Set the priorities of leaves indices (a priority of 0 takes a leaf out of sampling)."""
+        nodes = np.asarray(indices, dtype=np.int64) + self.size
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self.sums[nodes] = priorities
+        self.mins[nodes] = np.where(priorities > 0, priorities, np.inf)
+        for _ in range(self.depth):
+            # A parent listed twice just gets the same value written twice.
+            nodes >>= 1
+            left = 2 * nodes
+            self.sums[nodes] = self.sums[left] + self.sums[left + 1]
+            self.mins[nodes] = np.minimum(self.mins[left], self.mins[left + 1])
+
+    def update_range(self, start, priorities):
+        """update() for the consecutive leaves start, start + 1, ..."""
+        first = start + self.size
+        last = first + len(priorities) - 1
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self.sums[first:last + 1] = priorities
+        self.mins[first:last + 1] = np.where(priorities > 0, priorities, np.inf)
+        for _ in range(self.depth):
+            first >>= 1
+            last >>= 1
+            children = slice(2 * first, 2 * last + 2)
+            self.sums[first:last + 1] = self.sums[children][0::2] + self.sums[children][1::2]
+            self.mins[first:last + 1] = np.minimum(self.mins[children][0::2], self.mins[children][1::2])
+
+    def find(self, values):
+        """Return the leaves whose priority interval holds each of values (0 <= value < total)."""
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        for _ in range(self.depth):
+            left = self.sums[2 * nodes]
+            right = values >= left
+            values -= left * right
+            nodes = 2 * nodes + right
+        return nodes - self.size
+
+
+class PrioritizedReplayBuffer(SnakeReplayBuffer):
+    """
+    SnakeReplayBuffer with proportional prioritized sampling (Schaul et al.,
+    "Prioritized Experience Replay").
+
+    Transition (position, env) is leaf position * n_envs + env of a
+    PriorityTree. New transitions get the highest priority seen so far;
+    sample() draws one prefix sum per equal slice of the total (stratified)
+    and returns the importance-sampling weights (N * P(i)) ** -beta, divided
+    by the largest one, with the samples. update_priorities() sets the
+    sampled transitions' priorities to (|TD error| + epsilon) ** alpha.
+    """
+
+    def __init__(self, buffer_size, observation_space, action_space, device="auto", n_envs=1,
+                 optimize_memory_usage=False, handle_timeout_termination=True, encoding="packed",
+                 alpha=PRIORITY_ALPHA, beta=PRIORITY_BETA, epsilon=PRIORITY_EPSILON):
+        super(PrioritizedReplayBuffer, self).__init__(buffer_size, observation_space, action_space, device,
+                                                      n_envs, optimize_memory_usage,
+                                                      handle_timeout_termination, encoding)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.tree = PriorityTree(self.buffer_size * self.n_envs)
+        self.max_priority = 1.0
+
+    def add(self, obs, next_obs, action, reward, done, infos):
+        pos = self.pos
+        super(PrioritizedReplayBuffer, self).add(obs, next_obs, action, reward, done, infos)
+        priorities = [self.max_priority] * self.n_envs
+        if self.full:
+            # The oldest transitions (now at self.pos) lost their observation
+            # to next_obs: keep them out of sampling until they are replaced.
+            if self.pos == pos + 1:
+                priorities += [0.0] * self.n_envs
+            else:
+                self.tree.update_range(0, [0.0] * self.n_envs)
+        self.tree.update_range(pos * self.n_envs, priorities)
+
+    def sample(self, batch_size, env=None):
+        total = self.tree.total
+        values = (np.arange(batch_size) + np.random.random_sample(batch_size)) * (total / batch_size)
+        indices = self.tree.find(np.minimum(values, np.nextafter(total, 0)))
+        batch_inds, env_indices = np.divmod(indices, self.n_envs)
+
+        # (N * P(i)) ** -beta / max_j (N * P(j)) ** -beta, with P(i) = priority / total.
+        weights = (self.tree[indices] / self.tree.min) ** -self.beta
+        samples = self._get_samples(batch_inds, env=env, env_indices=env_indices)
+        return PrioritizedReplayBufferSamples(*samples, weights=self.to_torch(weights.reshape(-1, 1).astype(np.float32)),
+                                              indices=indices)
+
+    def update_priorities(self, indices, td_errors):
+        """Set the priorities of sampled transitions from their TD errors."""
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.tree.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    def reset(self):
+        super(PrioritizedReplayBuffer, self).reset()
+        self.tree = PriorityTree(self.buffer_size * self.n_envs)
+        self.max_priority = 1.0
+
+
+class PrioritizedDQN(DQN):
+    """
+    DQN trained from a PrioritizedReplayBuffer: the Huber loss of each sampled
+    transition is scaled by its importance-sampling weight, the priorities are
+    updated with the new TD errors after every gradient step, and the buffer's
+    beta is annealed from its initial value to 1 over the training run.
+    """
+
+    def __init__(self, policy, env, **kwargs):
+        kwargs.setdefault("replay_buffer_class", PrioritizedReplayBuffer)
+        super(PrioritizedDQN, self).__init__(policy, env, **kwargs)
+        self.initial_beta = self.replay_buffer.beta
+
+    def train(self, gradient_steps, batch_size=100):
+        self.policy.set_training_mode(True)
+        self._update_learning_rate(self.policy.optimizer)
+        progress = 1.0 - self._current_progress_remaining
+        self.replay_buffer.beta = self.initial_beta + (1.0 - self.initial_beta) * progress
+
+        losses = []
+        for _ in range(gradient_steps):
+            replay_data = self.replay_buffer.sample(batch_size, env=self._vec_normalize_env)
+
+            with th.no_grad():
+                next_q_values, _ = self.q_net_target(replay_data.next_observations).max(dim=1)
+                next_q_values = next_q_values.reshape(-1, 1)
+                target_q_values = replay_data.rewards + (1 - replay_data.dones) * self.gamma * next_q_values
+
+            current_q_values = self.q_net(replay_data.observations)
+            current_q_values = th.gather(current_q_values, dim=1, index=replay_data.actions.long())
+
+            # Importance-sampling weighted Huber loss.
+            elementwise_loss = F.smooth_l1_loss(current_q_values, target_q_values, reduction="none")
+            loss = (replay_data.weights * elementwise_loss).mean()
+            losses.append(loss.item())
+
+            self.policy.optimizer.zero_grad()
+            loss.backward()
+            th.nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
+            self.policy.optimizer.step()
+
+            td_errors = (current_q_values - target_q_values).detach().cpu().numpy().ravel()
+            self.replay_buffer.update_priorities(replay_data.indices, td_errors)
+
+        self._n_updates += gradient_steps
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/loss", np.mean(losses))
+        self.logger.record("train/beta", self.replay_buffer.beta)
+
+
+# --- Sampling check ---
+#
+# Checks that sampling follows the priorities and times update() and sample()
+# on a full buffer of a million transitions.
+#
+if __name__ == "__main__":
+    import argparse
+
+    from snake_vec_env import SnakeVecEnv
+
+    parser = argparse.ArgumentParser(description="Check and time the prioritized replay buffer.")
+    parser.add_argument("--transitions", type=int, default=1000000)
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    # The tree alone: sampling frequencies must match the priorities.
+    tree = PriorityTree(1000)
+    priorities = np.random.random_sample(1000) ** 3
+    tree.update(np.arange(1000), priorities)
+    assert np.isclose(tree.total, priorities.sum()) and np.isclose(tree.min, priorities.min())
+    counts = np.bincount(tree.find(np.random.random_sample(2000000) * tree.total), minlength=1000)
+    distance = 0.5 * np.abs(counts / 2000000.0 - priorities / priorities.sum()).sum()
+    print("Sampling vs priorities, total variation distance: {:.4f}".format(distance))
+    assert distance < 0.02
+
+    # A full buffer.
+    env = SnakeVecEnv(args.envs, seed=0)
+    buffer = PrioritizedReplayBuffer(args.transitions, env.observation_space, env.action_space,
+                                     device="cpu", n_envs=args.envs)
+    obs = env.reset()
+    actions = np.zeros(args.envs, dtype=np.int64)
+    rewards = np.zeros(args.envs, dtype=np.float32)
+    dones = np.zeros(args.envs, dtype=bool)
+    infos = [{} for _ in range(args.envs)]
+    start = time.perf_counter()
+    for _ in range(buffer.buffer_size):
+        buffer.add(obs, obs, actions, rewards, dones, infos)
+    print("add(): {:.1f} us per step of {} envs".format(
+        (time.perf_counter() - start) / buffer.buffer_size * 1e6, args.envs))
+
+    start = time.perf_counter()
+    for _ in range(100):
+        samples = buffer.sample(args.batch_size)
+        buffer.update_priorities(samples.indices, np.random.standard_normal(args.batch_size))
+    print("sample({0}) + update_priorities({0}) on {1} transitions: {2:.0f} us".format(
+        args.batch_size, buffer.buffer_size * args.envs, (time.perf_counter() - start) / 100 * 1e6))
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+# === Cell Codes ===
+#
+# A frame is rasterized from one code per cell. 0, 1 and 3 are the
+# observation grid's values (empty, snake, trap); the apple gets the code
+# CODE_APPLE + the index of its colour instead of 2, and the snake is coded 1
+# even where it crosses a trap (it is drawn on top). CODE_BLANK is a black
+# cell without grid lines, used to pad tiled frames.
+#
+CODE_EMPTY = 0
+CODE_SNAKE = 1
+CODE_BLANK = 2
+CODE_TRAP  = 3
+CODE_APPLE = 4
+
+
+class Rasterizer:
+    """
+    Builds RGB frames with NumPy alone (no pygame, no window).
+
+    Every code has a pre-drawn cell_size x cell_size tile (an empty cell is the
+    background with its 1-pixel grid outline, an occupied cell is filled with its
+    colour): the same pixels the pygame drawing of SnakeEnv produced. A frame is
+    one palette lookup of tile rows (code * cell_size + pixel row for every cell
+    and pixel row), which lands directly in (height * cell_size, width *
+    cell_size, 3) order, so the frame is built in a single copy. tiled() does the
+    same for a whole batch of boards at once, laid out in rows and columns.
+    """
+
+    def __init__(self, cell_size, background_color, grid_color, snake_color, trap_color, apple_colors):
+        self.cell_size = cell_size
+        tiles = np.zeros((CODE_APPLE + len(apple_colors), cell_size, cell_size, 3), dtype=np.uint8)
+        tiles[CODE_EMPTY] = background_color
+        tiles[CODE_EMPTY, [0, -1], :] = grid_color
+        tiles[CODE_EMPTY, :, [0, -1]] = grid_color
+        tiles[CODE_SNAKE] = snake_color
+        tiles[CODE_TRAP] = trap_color
+        tiles[CODE_APPLE:] = np.array(apple_colors, dtype=np.uint8)[:, None, None, :]
+        self.tiles = tiles
+        self.tile_rows = tiles.reshape(-1, cell_size * 3)  # Pixel rows of all tiles.
+        self.row_offsets = np.arange(cell_size)[:, None]
+
+    def frame(self, codes):
+        """Return the (H * cell_size, W * cell_size, 3) uint8 frame of a (H, W) code grid."""
+        height, width = codes.shape
+        size = self.cell_size
+        rows = codes[:, None, :].astype(np.intp) * size + self.row_offsets  # (H, size, W) tile row numbers
+        return self.tile_rows[rows].reshape(height * size, width * size, 3)
+
+    def frames(self, codes):
+        """Return the (N, H * cell_size, W * cell_size, 3) frames of (N, H, W) code grids."""
+        n, height, width = codes.shape
+        size = self.cell_size
+        rows = codes[:, :, None, :].astype(np.intp) * size + self.row_offsets  # (N, H, size, W) tile row numbers
+        return self.tile_rows[rows].reshape(n, height * size, width * size, 3)
+
+    def tiled(self, codes, columns=None):
+        """
+        Return one frame showing N boards ((N, H, W) code grids) in a grid of
+        `columns` columns (default: as square as possible); unused places are black.
+        """
+        n, height, width = codes.shape
+        if columns is None:
+            columns = int(math.ceil(math.sqrt(n)))
+        rows = int(math.ceil(n / float(columns)))
+        if rows * columns > n:
+            padding = np.full((rows * columns - n, height, width), CODE_BLANK, dtype=codes.dtype)
+            codes = np.concatenate([codes, padding])
+        board_rows = codes.reshape(rows, columns, height, width).transpose(0, 2, 1, 3)
+        return self.frame(board_rows.reshape(rows * height, columns * width))
@@ -0,0 +1,117 @@
+import pygame
+
+
+class BoardRenderer:
+    """
+    Draws the board onto the window with dirty rectangles.
+
+    The background (fill colour and grid lines) is drawn once into a cached
+    surface. Each frame the game passes draw_changes() only the cells that
+    changed (new head, vacated tail, apple, new trap, cut segment) with their
+    new colour, and just those cells are repainted and passed to
+    pygame.display.update(). The status text is rendered again only when it
+    changes, so a frame costs as much as the number of cells that changed,
+    not the length of the snake or the number of traps. Only the full redraw
+    after invalidate() goes over every occupied cell.
+
+    With grid_on_top the grid lines are drawn over the cells (snake_game3B.py),
+    otherwise the cells cover them (snake_game3B-DQN.py).
+    """
+
+    def __init__(self, screen, grid_width, grid_height, cell_size, background_color, grid_color,
+                 grid_on_top=False, font=None, text_color=(255, 255, 255), text_pos=(10, 10)):
+        self.screen = screen
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cell_size = cell_size
+        self.grid_color = grid_color
+        self.grid_on_top = grid_on_top
+        self.font = font
+        self.text_color = text_color
+        self.text_pos = text_pos
+
+        width, height = screen.get_size()
+        self.background = pygame.Surface((width, height))
+        self.background.fill(background_color)
+        for x in range(0, width, cell_size):
+            pygame.draw.line(self.background, grid_color, (x, 0), (x, height))
+        for y in range(0, height, cell_size):
+            pygame.draw.line(self.background, grid_color, (0, y), (width, y))
+
+        self.colors = {}      # Colour currently on screen for each occupied cell.
+        self.text = None
+        self.text_surface = None
+        self.text_rect = None
+        self.drawn_text = None  # Text surface currently on screen.
+        self.full_redraw = True
+
+    def cell_rect(self, cell):
+        size = self.cell_size
+        return pygame.Rect(cell[0] * size, cell[1] * size, size, size)
+
+    def _paint(self, cell, color):
+        """Draw one cell (color None: background) and return its rect."""
+        rect = self.cell_rect(cell)
+        if color is None:
+            self.screen.blit(self.background, rect, rect)
+        else:
+            self.screen.fill(color, rect)
+            if self.grid_on_top:
+                # The cell's own grid lines are its left column and top row.
+                self.screen.fill(self.grid_color, (rect.x, rect.y, 1, rect.height))
+                self.screen.fill(self.grid_color, (rect.x, rect.y, rect.width, 1))
+        return rect
+
+    def _restore(self, area):
+        """Redraw background and cells under area (to erase the old text)."""
+        self.screen.blit(self.background, area, area)
+        size = self.cell_size
+        for x in range(area.left // size, min((area.right - 1) // size, self.grid_width - 1) + 1):
+            for y in range(area.top // size, min((area.bottom - 1) // size, self.grid_height - 1) + 1):
+                color = self.colors.get((x, y))
+                if color is not None:
+                    self._paint((x, y), color)
+
+    def draw_changes(self, changes, text=None):
+        """
+        Bring the window up to date: changes maps each (x, y) cell that changed
+        since the last call to its colour (None: empty again); text is the
+        status line.
+        """
+        dirty = []
+        for cell, color in changes.items():
+            if self.colors.get(cell) == color:
+                continue
+            if color is None:
+                del self.colors[cell]
+            else:
+                self.colors[cell] = color
+            if not self.full_redraw:
+                dirty.append(self._paint(cell, color))
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            for cell, color in self.colors.items():
+                self._paint(cell, color)
+            dirty = [self.screen.get_rect()]
+
+        if self.font is not None and text is not None:
+            if text != self.text:
+                self.text = text
+                self.text_surface = self.font.render(text, True, self.text_color)
+            new_rect = self.text_surface.get_rect(topleft=self.text_pos)
+            if (self.full_redraw or self.text_surface is not self.drawn_text or
+                    new_rect.collidelist(dirty) >= 0):
+                area = new_rect if self.text_rect is None else new_rect.union(self.text_rect)
+                if not self.full_redraw:
+                    self._restore(area)
+                self.screen.blit(self.text_surface, self.text_pos)
+                self.text_rect = new_rect
+                self.drawn_text = self.text_surface
+                dirty.append(area)
+
+        self.full_redraw = False
+        pygame.display.update(dirty)
+
+    def invalidate(self):
+        """Redraw the whole window on the next draw_changes() (e.g. after it was uncovered)."""
+        self.full_redraw = True
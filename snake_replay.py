@@ -0,0 +1,187 @@
+import argparse
+import collections
+import os
+import random
+import struct
+import time
+
+import gym
+
+# === Replay File Format ===
+#
+# One file per episode:
+#   header   magic "SNKR", format version, seed (int64), grid width, grid height,
+#            trap interval (uint16 each), policy id (uint8 length + UTF-8 text)
+#   actions  one byte per step (0: UP, 1: DOWN, 2: LEFT, 3: RIGHT)
+# SnakeEnv is deterministic given its seed and the actions, so this is enough
+# to re-simulate the whole game: a few KB even for a game of thousands of steps.
+#
+REPLAY_MAGIC   = b"SNKR"
+REPLAY_VERSION = 1
+REPLAY_HEADER  = struct.Struct("<4sBqHHHB")
+REPLAY_SUFFIX  = ".snkr"
+
+Replay = collections.namedtuple("Replay", "seed grid_width grid_height trap_interval policy_id actions")
+
+
+def encode_replay(replay):
+    """Return the bytes of a replay file."""
+    policy_id = replay.policy_id.encode("utf-8")[:255]
+    header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, replay.seed, replay.grid_width,
+                                replay.grid_height, replay.trap_interval, len(policy_id))
+    return header + policy_id + bytes(replay.actions)
+
+
+def decode_replay(data):
+    """Return the Replay stored in data (bytes, or a memoryview of them)."""
+    magic, version, seed, width, height, trap_interval, id_length = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC:
+        raise ValueError("Not a Snake replay (bad magic {!r})".format(magic))
+    if version != REPLAY_VERSION:
+        raise ValueError("Unsupported replay version: {}".format(version))
+    start = REPLAY_HEADER.size
+    policy_id = bytes(data[start:start + id_length]).decode("utf-8")
+    actions = bytes(data[start + id_length:])
+    return Replay(seed, width, height, trap_interval, policy_id, actions)
+
+
+def write_replay(path, replay):
+    with open(path, "wb") as f:
+        f.write(encode_replay(replay))
+
+
+def read_replay(path):
+    with open(path, "rb") as f:
+        return decode_replay(f.read())
+
+
+# --- Recording ---
+class ReplayRecorder(gym.Wrapper):
+    """
+    Wraps a SnakeEnv and saves every episode as a replay file in `directory`
+    (episode_000000.snkr, episode_000001.snkr, ...).
+
+    Each reset() seeds the env with a fresh 63-bit seed, drawn from a
+    generator seeded with `seed`, so a whole recording session is reproducible
+    too. The actions are kept in memory and each episode is written in one go
+    when it ends (or at the next reset()/close() if it was cut short).
+    """
+
+    def __init__(self, env, directory, policy_id="", seed=None):
+        super(ReplayRecorder, self).__init__(env)
+        self.directory = directory
+        self.policy_id = policy_id
+        self.seed_source = random.Random(seed)
+        os.makedirs(directory, exist_ok=True)
+        self.episode = 0
+        self.episode_seed = None
+        self.actions = bytearray()
+        self.last_path = None   # File and length of the last episode written.
+        self.last_steps = 0
+
+    def reset(self, **kwargs):
+        self.end_episode()
+        self.episode_seed = self.seed_source.randrange(2 ** 63)
+        self.env.seed(self.episode_seed)
+        return self.env.reset()
+
+    def step(self, action):
+        self.actions.append(int(action))
+        obs, reward, done, info = self.env.step(action)
+        if done:
+            self.end_episode()
+        return obs, reward, done, info
+
+    def end_episode(self):
+        """Write the current episode (if it has any steps); called automatically when it ends."""
+        if self.episode_seed is None or not self.actions:
+            return
+        env = self.env.unwrapped
+        replay = Replay(self.episode_seed, env.grid_width, env.grid_height, env.trap_interval,
+                        self.policy_id, self.actions)
+        self.last_path = os.path.join(self.directory, "episode_{:06d}{}".format(self.episode, REPLAY_SUFFIX))
+        write_replay(self.last_path, replay)
+        self.last_steps = len(self.actions)
+        self.episode += 1
+        self.episode_seed = None
+        self.actions = bytearray()
+
+    def close(self):
+        self.end_episode()
+        self.env.close()
+
+
+# --- Playback ---
+def replay_episode(replay, env=None, steps=None):
+    """
+    Re-simulate a replay (or its first `steps` steps) as fast as possible.
+    Returns (env, total_reward); env is left at the final state.
+    """
+    if env is None:
+        from snake_gameRL1 import SnakeEnv
+        env = SnakeEnv(headless=True, copy_observation=False)
+    if (env.grid_width, env.grid_height) != (replay.grid_width, replay.grid_height):
+        raise ValueError("Replay is for a {}x{} grid, the env is {}x{}".format(
+            replay.grid_width, replay.grid_height, env.grid_width, env.grid_height))
+    env.trap_interval = replay.trap_interval
+    env.seed(replay.seed)
+    env.reset()
+    total_reward = 0.0
+    step = env.step
+    for action in replay.actions[:steps]:
+        total_reward += step(action)[1]
+    return env, total_reward
+
+
+def record(directory, episodes, backend, seed, max_steps):
+    """Play `episodes` games of SnakeEnv with a DQN policy backend and record them."""
+    from snake_gameRL1 import SnakeEnv
+    from snake_policy import load_policy
+    policy = load_policy(backend)
+    env = ReplayRecorder(SnakeEnv(headless=True), directory, policy_id="dqn:" + backend, seed=seed)
+    for _ in range(episodes):
+        obs = env.reset()
+        for _ in range(max_steps):
+            obs, _, done, _ = env.step(policy.predict(obs))
+            if done:
+                break
+        env.end_episode()
+        print("{}: {} steps, score {}, {} bytes".format(env.last_path, env.last_steps, env.unwrapped.score,
+                                                       os.path.getsize(env.last_path)))
+    env.close()
+
+
+def play(paths):
+    """Re-simulate replay files at full speed and print their final score."""
+    for path in paths:
+        replay = read_replay(path)
+        start = time.perf_counter()
+        env, total_reward = replay_episode(replay)
+        elapsed = time.perf_counter() - start
+        print("{}: seed {}  policy {!r}  steps {}  score {}  reward {:.1f}  steps/sec {:.0f}".format(
+            path, replay.seed, replay.policy_id, len(replay.actions), env.score, total_reward,
+            len(replay.actions) / max(elapsed, 1e-9)))
+
+
+# --- Replay tool ---
+#
+#   python snake_replay.py record --dir replays --episodes 10
+#   python snake_replay.py play replays/*.snkr
+#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay Snake games.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="record DQN games of SnakeEnv")
+    record_parser.add_argument("--dir", default="replays", help="output directory (default: %(default)s)")
+    record_parser.add_argument("--episodes", type=int, default=10)
+    record_parser.add_argument("--backend", default="numpy", help="DQN policy backend (default: %(default)s)")
+    record_parser.add_argument("--seed", type=int, default=None, help="seed of the recording session")
+    record_parser.add_argument("--max-steps", type=int, default=100000, help="cut episodes after this many steps")
+    play_parser = commands.add_parser("play", help="re-simulate replay files at full speed")
+    play_parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.dir, args.episodes, args.backend, args.seed, args.max_steps)
+    else:
+        play(args.paths)
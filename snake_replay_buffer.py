@@ -0,0 +1,196 @@
+import time
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.buffers import BaseBuffer, ReplayBuffer
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+
+# Frame encodings: one int8 per cell, or four 2-bit cells per byte.
+ENCODINGS = ("int8", "packed")
+
+# Byte -> its four 2-bit cells as float32, so decoding a packed batch is one lookup.
+PACKED_CELLS = ((np.arange(256)[:, None] >> np.array([0, 2, 4, 6])) & 3).astype(np.float32)
+
+
+class SnakeReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer for Snake grid observations (cell values 0-3) that stores
+    every frame once, as int8 or bit-packed into 2-bit cells.
+
+    As with Stable-Baselines3's optimize_memory_usage, the next observation of
+    transition i is the frame stored at i + 1, where the following transition's
+    observation goes. The exception is the last transition of an episode: the
+    next add() puts the reset observation there, so its terminal observation
+    is kept aside, by position, until the slot is reused. Actions are stored
+    as uint8 and dones as bool, and frames are only decoded to float32 (the
+    dtype the Q-network computes in) for the sampled batch, all at once.
+
+    Per transition that is about 110 bytes packed and 410 bytes as int8
+    (terminal frames included), against 820 for the default ReplayBuffer with
+    int8 observations (obs and next_obs, int64 action, float32 reward, done
+    and timeout). Use it with
+    DQN(..., replay_buffer_class=SnakeReplayBuffer,
+    replay_buffer_kwargs={"encoding": "packed"}).
+    """
+
+    def __init__(self, buffer_size, observation_space, action_space, device="auto", n_envs=1,
+                 optimize_memory_usage=False, handle_timeout_termination=True, encoding="packed"):
+        # The ReplayBuffer arrays are not allocated: skip to BaseBuffer.
+        BaseBuffer.__init__(self, buffer_size, observation_space, action_space, device, n_envs=n_envs)
+        if not (isinstance(observation_space, spaces.Box) and np.all(observation_space.low >= 0)
+                and np.all(observation_space.high <= 3)):
+            raise ValueError("SnakeReplayBuffer needs grid observations with cell values 0-3, "
+                             "got {}".format(observation_space))
+        if encoding not in ENCODINGS:
+            raise ValueError("Unknown encoding: {!r}".format(encoding))
+
+        self.buffer_size = max(buffer_size // n_envs, 1)
+        self.optimize_memory_usage = True  # Always: next observations share the frames.
+        self.handle_timeout_termination = handle_timeout_termination
+        self.encoding = encoding
+        self.n_cells = int(np.prod(self.obs_shape))
+        self.frame_size = (self.n_cells + 3) // 4 if encoding == "packed" else self.n_cells
+
+        self.frames = np.zeros((self.buffer_size, n_envs, self.frame_size), dtype=np.uint8)
+        self.actions = np.zeros((self.buffer_size, n_envs), dtype=np.uint8)
+        self.rewards = np.zeros((self.buffer_size, n_envs), dtype=np.float32)
+        self.dones = np.zeros((self.buffer_size, n_envs), dtype=bool)
+        self.timeouts = np.zeros((self.buffer_size, n_envs), dtype=bool)
+        self.terminal = {}  # Position -> (env indices, their encoded terminal frames).
+
+    @property
+    def nbytes(self):
+        """Memory used by the stored transitions (terminal frames included)."""
+        terminal = sum(frames.nbytes for _, frames in self.terminal.values())
+        return (self.frames.nbytes + self.actions.nbytes + self.rewards.nbytes +
+                self.dones.nbytes + self.timeouts.nbytes + terminal)
+
+    def encode(self, obs):
+        """Return the (n, frame_size) uint8 encoding of n observations."""
+        cells = np.asarray(obs).reshape(len(obs), self.n_cells).astype(np.uint8)
+        if self.encoding == "int8":
+            return cells
+        padding = self.frame_size * 4 - self.n_cells
+        if padding:
+            cells = np.pad(cells, ((0, 0), (0, padding)))
+        cells = cells.reshape(len(obs), self.frame_size, 4)
+        return cells[:, :, 0] | (cells[:, :, 1] << 2) | (cells[:, :, 2] << 4) | (cells[:, :, 3] << 6)
+
+    def decode(self, frames):
+        """Return the float32 observations (n, *obs_shape) of n encoded frames."""
+        if self.encoding == "int8":
+            cells = frames.astype(np.float32)
+        else:
+            cells = np.take(PACKED_CELLS, frames, axis=0)  # Faster than PACKED_CELLS[frames].
+            cells = cells.reshape(len(frames), self.frame_size * 4)[:, :self.n_cells]
+        return cells.reshape(len(frames), *self.obs_shape)
+
+    def add(self, obs, next_obs, action, reward, done, infos):
+        pos = self.pos
+        next_frames = self.encode(next_obs)
+        self.frames[pos] = self.encode(obs)
+        self.frames[(pos + 1) % self.buffer_size] = next_frames
+        self.actions[pos] = np.asarray(action).reshape(self.n_envs)
+        self.rewards[pos] = reward
+        self.dones[pos] = done
+        if self.handle_timeout_termination:
+            self.timeouts[pos] = [info.get("TimeLimit.truncated", False) for info in infos]
+
+        self.terminal.pop(pos, None)
+        ended = np.flatnonzero(done)
+        if len(ended):
+            self.terminal[pos] = (ended, next_frames[ended])
+
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+
+    def sample(self, batch_size, env=None):
+        # The transition at self.pos has lost its observation (overwritten by the
+        # newest next_obs), so skip it.
+        if self.full:
+            batch_inds = (np.random.randint(1, self.buffer_size, size=batch_size) + self.pos) % self.buffer_size
+        else:
+            batch_inds = np.random.randint(0, self.pos, size=batch_size)
+        return self._get_samples(batch_inds, env=env)
+
+    def _get_samples(self, batch_inds, env=None, env_indices=None):
+        if env_indices is None:
+            env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
+        next_frames = self.frames[(batch_inds + 1) % self.buffer_size, env_indices]
+        dones = self.dones[batch_inds, env_indices]
+        for row in np.flatnonzero(dones):
+            ended, frames = self.terminal[batch_inds[row]]
+            next_frames[row] = frames[np.searchsorted(ended, env_indices[row])]
+
+        data = (
+            self._normalize_obs(self.decode(self.frames[batch_inds, env_indices]), env),
+            self.actions[batch_inds, env_indices].astype(np.int64).reshape(-1, 1),
+            self._normalize_obs(self.decode(next_frames), env),
+            (dones & ~self.timeouts[batch_inds, env_indices]).astype(np.float32).reshape(-1, 1),
+            self._normalize_reward(self.rewards[batch_inds, env_indices].reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
+
+    def reset(self):
+        super(SnakeReplayBuffer, self).reset()
+        self.terminal = {}
+
+
+# --- Memory and speed check ---
+#
+# Fills the default ReplayBuffer and both SnakeReplayBuffer encodings with the
+# same SnakeVecEnv transitions, checks that they give the same batches and
+# prints the bytes per transition and the sampling time.
+#
+if __name__ == "__main__":
+    import argparse
+
+    from snake_vec_env import SnakeVecEnv
+
+    parser = argparse.ArgumentParser(description="Compare SnakeReplayBuffer with the default ReplayBuffer.")
+    parser.add_argument("--transitions", type=int, default=200000)
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    env = SnakeVecEnv(args.envs, seed=0)
+    buffers = {"default": ReplayBuffer(args.transitions, env.observation_space, env.action_space,
+                                       device="cpu", n_envs=args.envs)}
+    for encoding in ENCODINGS:
+        buffers[encoding] = SnakeReplayBuffer(args.transitions, env.observation_space, env.action_space,
+                                              device="cpu", n_envs=args.envs, encoding=encoding)
+
+    obs = env.reset()
+    rng = np.random.default_rng(0)
+    steps = args.transitions // args.envs - 1  # Leave the buffers one step short of full.
+    for _ in range(steps):
+        actions = rng.integers(0, 4, size=args.envs)
+        new_obs, rewards, dones, infos = env.step(actions)
+        next_obs = new_obs.copy()
+        for i in np.flatnonzero(dones):
+            next_obs[i] = infos[i]["terminal_observation"]
+        for buffer in buffers.values():
+            buffer.add(obs, next_obs, actions, rewards, dones, infos)
+        obs = new_obs
+
+    batch_inds = np.random.randint(0, steps, size=4096)
+    for name, buffer in buffers.items():
+        np.random.seed(0)
+        samples = buffer._get_samples(batch_inds)
+        if name == "default":
+            reference = samples
+        elif not all(bool((a.float() == b.float()).all()) for a, b in zip(samples[:5], reference[:5])):
+            raise SystemExit("{} buffer gives different batches!".format(name))
+
+        nbytes = buffer.nbytes if name != "default" else (
+            buffer.observations.nbytes + buffer.next_observations.nbytes + buffer.actions.nbytes +
+            buffer.rewards.nbytes + buffer.dones.nbytes + buffer.timeouts.nbytes)
+        per_transition = nbytes / float(buffer.buffer_size * buffer.n_envs)
+        start = time.perf_counter()
+        for _ in range(200):
+            buffer.sample(args.batch_size)
+        sample_us = (time.perf_counter() - start) / 200 * 1e6
+        print("{:8s} {:4.0f} bytes/transition ({:.0f} MB per million)  sample({}): {:.0f} us".format(
+            name, per_transition, per_transition, args.batch_size, sample_us))
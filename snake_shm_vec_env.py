@@ -0,0 +1,368 @@
+import multiprocessing as mp
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from snake_gameRL1 import RASTERIZER, SnakeEnv
+
+# --- Worker commands (written to the control block before the barrier) ---
+COMMAND_STEP = 0
+COMMAND_RESET = 1
+COMMAND_CALL = 2   # get_attr/set_attr/env_method: the request comes through the worker's pipe.
+COMMAND_CLOSE = 3
+
+# Seconds the parent waits at a barrier before it gives up on the workers.
+BARRIER_TIMEOUT = 60.0
+
+
+def shared_layout(num_envs, obs_shape, obs_dtype):
+    """(name, dtype, shape) of every array in the shared block, in order."""
+    return [
+        ("control", np.int64, (3,)),  # command, slot, set when a worker failed
+        ("actions", np.int64, (num_envs,)),
+        ("seeds", np.int64, (num_envs,)),
+        ("seeded", np.bool_, (num_envs,)),
+        ("obs", obs_dtype, (2, num_envs) + tuple(obs_shape)),
+        ("rewards", np.float32, (2, num_envs)),
+        ("dones", np.bool_, (2, num_envs)),
+        ("board_full", np.bool_, (num_envs,)),
+        ("terminal_obs", obs_dtype, (num_envs,) + tuple(obs_shape)),
+    ]
+
+
+def shared_arrays(buf, layout):
+    """Map the arrays of layout onto buf (8-byte aligned); return them by name and the size used."""
+    arrays = {}
+    offset = 0
+    for name, dtype, shape in layout:
+        dtype = np.dtype(dtype)
+        if buf is not None:
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += (int(np.prod(shape)) * dtype.itemsize + 7) // 8 * 8
+    return arrays, offset
+
+
+# --- Worker process ---
+def run_worker(shm_name, layout, env_indices, env_kwargs, barrier, pipe):
+    """
+    Step the envs env_indices, writing straight into the shared arrays, between
+    barrier waits. An exception sets the control block's failed flag and its
+    traceback goes to the parent through the pipe (CALL results are sent as
+    ("ok", results)); the worker then waits to be closed.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays, _ = shared_arrays(shm.buf, layout)
+    control, actions, obs = arrays["control"], arrays["actions"], arrays["obs"]
+    rewards, dones = arrays["rewards"], arrays["dones"]
+    board_full, terminal_obs = arrays["board_full"], arrays["terminal_obs"]
+    envs = []
+
+    try:
+        envs = [SnakeEnv(headless=True, copy_observation=False, **env_kwargs) for _ in env_indices]
+    except Exception:
+        control[2] = 1
+        pipe.send(("error", traceback.format_exc()))
+
+    while True:
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            break  # The parent gave up on the workers.
+        command, slot = int(control[0]), int(control[1])
+        try:
+            if control[2] and command != COMMAND_CLOSE:
+                pass  # Something failed: only closing is left.
+            elif command == COMMAND_STEP:
+                for i, env in zip(env_indices, envs):
+                    observation, reward, done, info = env.step(int(actions[i]))
+                    if done:
+                        terminal_obs[i] = observation
+                        board_full[i] = info.get("board_full", False)
+                        observation = env.reset()
+                    obs[slot, i] = observation
+                    rewards[slot, i] = reward
+                    dones[slot, i] = done
+            elif command == COMMAND_RESET:
+                for i, env in zip(env_indices, envs):
+                    if arrays["seeded"][i]:
+                        env.seed(int(arrays["seeds"][i]))
+                    obs[slot, i] = env.reset()
+            elif command == COMMAND_CALL:
+                kind, name, args, kwargs, indices = pipe.recv()
+                results = []
+                for i, env in zip(env_indices, envs):
+                    if i not in indices:
+                        continue
+                    if kind == "get_attr":
+                        results.append(getattr(env, name))
+                    elif kind == "set_attr":
+                        setattr(env, name, args[0])
+                        results.append(None)
+                    else:
+                        results.append(getattr(env, name)(*args, **kwargs))
+                pipe.send(("ok", results))
+        except Exception:
+            control[2] = 1
+            pipe.send(("error", traceback.format_exc()))
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            break
+        if command == COMMAND_CLOSE:
+            break
+
+    for env in envs:
+        env.close()
+    del arrays, control, actions, obs, rewards, dones, board_full, terminal_obs
+    shm.close()
+
+
+# --- The Shared-Memory Subprocess Environment ---
+class ShmVecEnv(VecEnv):
+    """
+    SnakeEnvs in worker processes that exchange nothing but a barrier per step.
+
+    The actions, observations, rewards and dones of all envs live in one
+    multiprocessing.shared_memory block. step_async() writes the actions there
+    and releases the workers through a multiprocessing.Barrier; each worker
+    steps its envs (resetting finished ones, their last observation goes to a
+    shared terminal_obs array) and writes the results in place, and a second
+    barrier wait tells step_wait() they are ready. Nothing is pickled on the
+    way: step_wait() returns (N, H, W) observations, rewards and dones that
+    are read-only views of the shared block, with info dicts built only for
+    finished episodes (terminal_observation, as Stable-Baselines3 expects).
+
+    The arrays alternate between two slots, so the results of a step stay
+    valid during the following step (Stable-Baselines3 still reads the
+    previous observation and dones then) and are overwritten by the one
+    after. Copy them to keep them longer. get_attr/set_attr/env_method are
+    rare, and go through a pipe to each worker.
+
+    If a worker raises, or dies, or the workers don't reach the barrier within
+    `timeout` seconds, the workers are stopped, the shared block is unlinked
+    and a RuntimeError (with the worker's traceback) is raised.
+    """
+
+    def __init__(self, num_envs, n_workers=None, seed=None, start_method=None, timeout=BARRIER_TIMEOUT,
+                 **env_kwargs):
+        n_workers = min(n_workers or mp.cpu_count(), num_envs)
+        probe = SnakeEnv(headless=True, **env_kwargs)
+        space = probe.observation_space
+        observation_space = spaces.Box(low=space.low, high=space.high, shape=space.shape, dtype=space.dtype)
+        probe.close()
+        self.render_mode = "rgb_array"
+        super(ShmVecEnv, self).__init__(num_envs, observation_space, spaces.Discrete(4))
+
+        self.layout = shared_layout(num_envs, observation_space.shape, observation_space.dtype)
+        _, size = shared_arrays(None, self.layout)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.arrays, _ = shared_arrays(self.shm.buf, self.layout)
+        self.slot = 0
+        self.timeout = timeout
+        # Read-only views handed out by reset() and step_wait(), per slot.
+        self._results = []
+        for slot in range(2):
+            views = [self.arrays[name][slot].view() for name in ("obs", "rewards", "dones")]
+            for view in views:
+                view.flags.writeable = False
+            self._results.append(views)
+        if seed is not None:
+            self.seed(seed)
+
+        ctx = mp.get_context(start_method)
+        self.barrier = ctx.Barrier(n_workers + 1)
+        self.worker_envs = [list(chunk) for chunk in np.array_split(np.arange(num_envs), n_workers)]
+        self.pipes = []
+        self.processes = []
+        for env_indices in self.worker_envs:
+            pipe, worker_pipe = ctx.Pipe()
+            process = ctx.Process(target=run_worker, daemon=True,
+                                  args=(self.shm.name, self.layout, env_indices, env_kwargs,
+                                        self.barrier, worker_pipe))
+            process.start()
+            worker_pipe.close()
+            self.pipes.append(pipe)
+            self.processes.append(process)
+        self.closed = False
+
+    def _wait(self):
+        """Wait at the barrier with the workers; stop them all and raise if they don't come."""
+        try:
+            self.barrier.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            dead = ["worker {} (exit code {})".format(i, process.exitcode)
+                    for i, process in enumerate(self.processes) if not process.is_alive()]
+            self._abort()
+            raise RuntimeError("ShmVecEnv: {}".format(
+                ", ".join(dead) + " died" if dead else
+                "workers did not answer within {} seconds".format(self.timeout)))
+
+    def _check_failed(self):
+        """Raise the error of a worker that failed during the last command."""
+        if not self.arrays["control"][2]:
+            return
+        errors = []
+        for pipe in self.pipes:
+            while pipe.poll():
+                status, message = pipe.recv()
+                if status == "error":
+                    errors.append(message)
+        self._abort()
+        raise RuntimeError("ShmVecEnv worker failed:\n" + "\n".join(errors))
+
+    def _run(self, command):
+        """Have every worker run command on the current slot and wait until they are done."""
+        if self.closed:
+            raise RuntimeError("ShmVecEnv is closed")
+        self.arrays["control"][:2] = (command, self.slot)
+        self._wait()
+        self._wait()
+        self._check_failed()
+
+    def _abort(self):
+        """Stop the workers without their cooperation and release the shared block."""
+        self.barrier.abort()
+        for process in self.processes:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._release()
+
+    def _release(self):
+        for pipe in self.pipes:
+            pipe.close()
+        self.arrays = self._results = None
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
+
+    # --- VecEnv API ---
+
+    def reset(self):
+        """Reset every env (with the seeds given to seed(), if any) and return the observations."""
+        if self.closed:
+            raise RuntimeError("ShmVecEnv is closed")
+        self.arrays["seeded"][:] = [seed is not None for seed in self._seeds]
+        self.arrays["seeds"][:] = [seed or 0 for seed in self._seeds]
+        self._reset_seeds()
+        self._reset_options()
+        self.slot = 1 - self.slot
+        self._run(COMMAND_RESET)
+        return self._results[self.slot][0]
+
+    def step_async(self, actions):
+        if self.closed:
+            raise RuntimeError("ShmVecEnv is closed")
+        self.arrays["actions"][:] = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        self.slot = 1 - self.slot
+        self._run(COMMAND_STEP)
+        obs, rewards, dones = self._results[self.slot]
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = self.arrays["terminal_obs"][i].copy()
+            infos[i]["TimeLimit.truncated"] = False
+            if self.arrays["board_full"][i]:
+                infos[i]["board_full"] = True
+        return obs, rewards, dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        self._run(COMMAND_CLOSE)
+        for process in self.processes:
+            process.join()
+        self._release()
+
+    def _call(self, kind, name, args, kwargs, indices):
+        if self.closed:
+            raise RuntimeError("ShmVecEnv is closed")
+        indices = list(self._get_indices(indices))
+        for pipe in self.pipes:
+            pipe.send((kind, name, args, kwargs, indices))
+        self.arrays["control"][:2] = (COMMAND_CALL, self.slot)
+        self._wait()
+        # Every worker answers once, before the second barrier (large results would
+        # otherwise fill the pipe and block it).
+        messages = []
+        for i, pipe in enumerate(self.pipes):
+            try:
+                if not pipe.poll(self.timeout):
+                    raise EOFError
+                messages.append(pipe.recv())
+            except EOFError:
+                self._abort()
+                raise RuntimeError("ShmVecEnv: worker {} did not answer {}({!r})".format(i, kind, name))
+        self._wait()
+        errors = [message for status, message in messages if status == "error"]
+        if errors:
+            self._abort()
+            raise RuntimeError("ShmVecEnv worker failed:\n" + "\n".join(errors))
+        return [result for _, results in messages for result in results]
+
+    def get_images(self):
+        """Return the RGB frame of every env (SnakeEnv.render('rgb_array'))."""
+        return self.env_method("render", "rgb_array")
+
+    def render(self, mode=None):
+        """'rgb_array' (default): one frame with all envs tiled in rows and columns."""
+        if mode in (None, "rgb_array"):
+            return RASTERIZER.tiled(np.stack(self.env_method("cell_codes")))
+        return super(ShmVecEnv, self).render(mode)
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "render_mode":  # Asked by VecEnv.__init__, before the workers exist.
+            return [self.render_mode for _ in self._get_indices(indices)]
+        return self._call("get_attr", attr_name, (), {}, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call("set_attr", attr_name, (value,), {}, indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call("env_method", method_name, method_args, method_kwargs, indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+
+# --- Throughput check ---
+#
+# Steps the same number of SnakeEnvs with random actions in ShmVecEnv and in
+# Stable-Baselines3's SubprocVecEnv (pickled over pipes) and reports env steps
+# per second.
+#
+if __name__ == "__main__":
+    import argparse
+
+    from stable_baselines3.common.env_util import make_vec_env
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+
+    parser = argparse.ArgumentParser(description="Compare ShmVecEnv with SubprocVecEnv.")
+    parser.add_argument("--envs", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=2000)
+    args = parser.parse_args()
+    workers = args.workers or mp.cpu_count()
+
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, size=(args.steps, args.envs))
+    envs = {
+        "ShmVecEnv": ShmVecEnv(args.envs, n_workers=workers, seed=0),
+        "SubprocVecEnv": make_vec_env(SnakeEnv, n_envs=args.envs, seed=0, env_kwargs={"headless": True},
+                                      vec_env_cls=SubprocVecEnv),
+    }
+    for name, env in envs.items():
+        env.reset()
+        start = time.perf_counter()
+        for step_actions in actions:
+            env.step(step_actions)
+        elapsed = time.perf_counter() - start
+        print("{:14s} {} envs: {:.0f} env steps/sec".format(name, args.envs, args.envs * args.steps / elapsed))
+        env.close()
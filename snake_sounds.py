@@ -0,0 +1,101 @@
+import collections
+
+import numpy as np
+
+# === Sound Synthesis ===
+#
+# The burp recipe of Make_Burp_Sound.py, generalised: a sine tone (optionally
+# sweeping from frequency to end_frequency) plus Gaussian noise, under an
+# exponential decay envelope, normalised and converted to 16-bit PCM.
+#
+SAMPLE_RATE = 44100  # Samples per second (pygame's default mixer frequency)
+
+Effect = collections.namedtuple("Effect", "frequency end_frequency duration decay noise seed")
+
+# The sound effects of the games. crash is the Make_Burp_Sound.py burp;
+# chirp matches chirp.wav (a short decaying ~370 Hz tone).
+EFFECTS = {
+    "chirp":     Effect(frequency=370.0, end_frequency=370.0, duration=0.5,  decay=5.0, noise=0.02, seed=1),
+    "crash":     Effect(frequency=35.0,  end_frequency=35.0,  duration=0.75, decay=5.0, noise=0.2,  seed=2),
+    "trap":      Effect(frequency=120.0, end_frequency=80.0,  duration=0.25, decay=8.0, noise=0.2,  seed=3),
+    "game_over": Effect(frequency=220.0, end_frequency=55.0,  duration=1.0,  decay=3.0, noise=0.1,  seed=4),
+}
+
+_buffers = {}  # (effect, sample_rate) -> int16 buffer, filled by synthesize_batch()
+_sounds = {}   # (name, mixer settings) -> pygame Sound, filled by make_sound()
+
+
+def synthesize_batch(effects, sample_rate=SAMPLE_RATE):
+    """
+    Return one mono int16 buffer per Effect. Effects not synthesized before are
+    computed together as rows of one (k, samples) array; each buffer is memoized
+    by its parameters, so the same Effect always gives the same (read-only) buffer.
+    """
+    missing = [e for e in dict.fromkeys(effects) if (e, sample_rate) not in _buffers]
+    if missing:
+        lengths = np.array([int(sample_rate * e.duration) for e in missing])
+        t = np.arange(lengths.max()) / float(sample_rate)
+        f0 = np.array([e.frequency for e in missing])[:, None]
+        f1 = np.array([e.end_frequency for e in missing])[:, None]
+        duration = np.array([e.duration for e in missing])[:, None]
+        decay = np.array([e.decay for e in missing])[:, None]
+        noise_level = np.array([e.noise for e in missing])[:, None]
+
+        # Linear frequency sweep: the phase is the integral of the frequency.
+        phase = 2 * np.pi * (f0 * t + (f1 - f0) * t * t / (2 * duration))
+        noise = np.stack([np.random.default_rng(e.seed).normal(0, 1, size=len(t)) for e in missing])
+        signal = np.exp(-decay * t) * (np.sin(phase) + noise_level * noise)
+        signal[t >= duration] = 0.0  # Shorter effects are padded with silence.
+
+        # Normalize each row to the range [-1, 1].
+        peak = np.abs(signal).max(axis=1, keepdims=True)
+        signal /= np.where(peak > 0, peak, 1.0)
+        pcm = np.int16(signal * 32767)
+
+        for e, row, n in zip(missing, pcm, lengths):
+            buffer = row[:n].copy()
+            buffer.flags.writeable = False
+            _buffers[(e, sample_rate)] = buffer
+    return [_buffers[(e, sample_rate)] for e in effects]
+
+
+def synthesize(effect, sample_rate=SAMPLE_RATE):
+    """Return the mono int16 buffer of one Effect."""
+    return synthesize_batch([effect], sample_rate)[0]
+
+
+def variants(name, count, spread=0.1, sample_rate=SAMPLE_RATE):
+    """
+    Return `count` variations of a named effect (pitch spread by up to +-spread
+    and different noise), generated in one vectorized call.
+    """
+    base = EFFECTS[name]
+    scales = np.linspace(1.0 - spread, 1.0 + spread, count) if count > 1 else [1.0]
+    effects = [base._replace(frequency=base.frequency * s, end_frequency=base.end_frequency * s,
+                             seed=base.seed * 1000 + i)
+               for i, s in enumerate(scales)]
+    return synthesize_batch(effects, sample_rate)
+
+
+# All game effects, synthesized once at import time.
+SOUND_BUFFERS = dict(zip(EFFECTS, synthesize_batch(list(EFFECTS.values()))))
+
+
+def make_sound(name):
+    """
+    Return the named effect as a pygame Sound built straight from its buffer
+    (no file I/O), matched to the mixer's frequency and channel count.
+    Returns None if the mixer isn't initialised or doesn't use 16-bit signed samples.
+    """
+    import pygame
+    init = pygame.mixer.get_init()
+    if init is None or init[1] != -16:
+        return None
+    frequency, _, channels = init
+    key = (name, init)
+    if key not in _sounds:
+        buffer = synthesize(EFFECTS[name], frequency)
+        if channels > 1:
+            buffer = np.repeat(buffer[:, None], channels, axis=1)
+        _sounds[key] = pygame.sndarray.make_sound(np.ascontiguousarray(buffer))
+    return _sounds[key]
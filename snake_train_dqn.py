@@ -0,0 +1,150 @@
+import argparse
+import time
+
+from stable_baselines3 import DQN
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
+
+from snake_gameRL1 import OBSERVATION_MODES, SnakeEnv
+from snake_prioritized_replay import PRIORITY_ALPHA, PRIORITY_BETA, PrioritizedDQN
+from snake_replay_buffer import ENCODINGS, SnakeReplayBuffer
+from snake_shm_vec_env import ShmVecEnv
+from snake_vec_env import SnakeVecEnv
+
+
+# --- Throughput reporting ---
+class StepsPerSecondCallback(BaseCallback):
+    """Print the env-steps/sec (wall clock, including training) while learning."""
+
+    def __init__(self, print_freq=1000):
+        super(StepsPerSecondCallback, self).__init__()
+        self.print_freq = print_freq
+        self.start_time = None
+        self.start_steps = 0
+
+    def _on_training_start(self):
+        self.start_time = time.perf_counter()
+        self.start_steps = self.num_timesteps
+
+    def _steps_per_second(self):
+        elapsed = time.perf_counter() - self.start_time
+        return (self.num_timesteps - self.start_steps) / max(elapsed, 1e-9)
+
+    def _on_step(self):
+        if self.n_calls % self.print_freq == 0:
+            print("Timesteps: {}  env-steps/sec: {:.0f}".format(
+                self.num_timesteps, self._steps_per_second()))
+        return True
+
+    def _on_training_end(self):
+        print("Training done. Timesteps: {}  average env-steps/sec: {:.0f}".format(
+            self.num_timesteps, self._steps_per_second()))
+
+
+# --- Environment construction ---
+def make_env(vec_env, workers, seed, observation="grid", window_size=0):
+    """
+    Build the vectorized training environment.
+        subproc: one headless SnakeEnv per worker process (SubprocVecEnv).
+        shm:     SnakeEnvs in one worker process per core, exchanging
+                 observations through shared memory (ShmVecEnv).
+        dummy:   the same envs, stepped one after another in this process.
+        batched: all boards in a single SnakeVecEnv (NumPy arrays, one process,
+                 grid observations only).
+    """
+    if vec_env == "batched":
+        return VecMonitor(SnakeVecEnv(workers, seed=seed))
+    if vec_env == "shm":
+        return VecMonitor(ShmVecEnv(workers, seed=seed, observation=observation, window_size=window_size))
+    vec_env_cls = SubprocVecEnv if vec_env == "subproc" else DummyVecEnv
+    return make_vec_env(SnakeEnv, n_envs=workers, seed=seed,
+                        env_kwargs={"headless": True, "observation": observation,
+                                    "window_size": window_size},
+                        vec_env_cls=vec_env_cls)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Snake DQN on several environments in parallel.")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of environments (worker processes for --vec-env subproc)")
+    parser.add_argument("--vec-env", choices=["subproc", "shm", "dummy", "batched"], default="subproc",
+                        help="how the environments are run (default: subproc)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="base seed; worker i is seeded with seed + i")
+    parser.add_argument("--observation", choices=OBSERVATION_MODES, default="grid",
+                        help="'grid': the whole board; 'features': a small feature vector "
+                             "that doesn't grow with the board (default: grid)")
+    parser.add_argument("--window-size", type=int, default=0,
+                        help="with --observation features, also observe the KxK cells around the head (K odd)")
+    parser.add_argument("--replay-buffer", choices=("auto", "sb3") + ENCODINGS, default="auto",
+                        help="'packed' or 'int8': SnakeReplayBuffer, storing every frame once with 2-bit "
+                             "or 8-bit cells; 'sb3': the default ReplayBuffer; 'auto' (default): "
+                             "packed for grid observations, sb3 for features")
+    parser.add_argument("--buffer-size", type=int, default=1000000,
+                        help="replay buffer size in transitions (default: %(default)s)")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="prioritized experience replay (a sum-tree over the packed or int8 buffer)")
+    parser.add_argument("--priority-alpha", type=float, default=PRIORITY_ALPHA,
+                        help="with --prioritized, how strongly TD errors shape sampling (default: %(default)s)")
+    parser.add_argument("--priority-beta", type=float, default=PRIORITY_BETA,
+                        help="with --prioritized, initial importance-sampling exponent, "
+                             "annealed to 1 (default: %(default)s)")
+    parser.add_argument("--timesteps", type=int, default=100000,
+                        help="total env steps across all workers")
+    parser.add_argument("--train-freq", type=int, default=4,
+                        help="update the model every train-freq vectorized steps")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="gradient steps per update (-1: as many as env steps collected)")
+    parser.add_argument("--output", default="dqn_snake_model",
+                        help="where to save the trained model")
+    parser.add_argument("--tensorboard-log", default="./dqn_tensorboard/",
+                        help="tensorboard log directory ('' to disable)")
+    parser.add_argument("--print-freq", type=int, default=1000,
+                        help="print env-steps/sec every print-freq vectorized steps")
+    args = parser.parse_args(argv)
+    if args.vec_env == "batched" and args.observation != "grid":
+        parser.error("--vec-env batched only supports --observation grid")
+    if args.replay_buffer == "auto":
+        args.replay_buffer = "packed" if args.observation == "grid" else "sb3"
+    if args.replay_buffer in ENCODINGS and args.observation != "grid":
+        parser.error("--replay-buffer {} only supports --observation grid".format(args.replay_buffer))
+    if args.prioritized and args.replay_buffer not in ENCODINGS:
+        parser.error("--prioritized needs --replay-buffer packed or int8 (and --observation grid)")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = make_env(args.vec_env, args.workers, args.seed, args.observation, args.window_size)
+
+    model_cls, buffer_kwargs = DQN, {}
+    if args.prioritized:
+        # PrioritizedDQN brings its own PrioritizedReplayBuffer (a SnakeReplayBuffer).
+        model_cls = PrioritizedDQN
+        buffer_kwargs = dict(replay_buffer_kwargs={"encoding": args.replay_buffer,
+                                                   "alpha": args.priority_alpha,
+                                                   "beta": args.priority_beta})
+    elif args.replay_buffer in ENCODINGS:
+        buffer_kwargs = dict(replay_buffer_class=SnakeReplayBuffer,
+                             replay_buffer_kwargs={"encoding": args.replay_buffer})
+
+    model = model_cls("MlpPolicy", env, verbose=1, seed=args.seed,
+                      buffer_size=args.buffer_size,
+                      train_freq=args.train_freq,
+                      gradient_steps=args.gradient_steps,
+                      tensorboard_log=args.tensorboard_log or None,
+                      **buffer_kwargs)
+    model.learn(total_timesteps=args.timesteps,
+                callback=StepsPerSecondCallback(args.print_freq))
+    model.save(args.output)
+    env.close()
+    print("Model saved to", args.output)
+
+
+# --- Parallel training entry point ---
+#
+#   python snake_train_dqn.py --workers 32 --seed 0 --train-freq 4 --gradient-steps 1
+#
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import time
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from snake_gameRL1 import GRID_WIDTH, GRID_HEIGHT, APPLE_COLORS, RASTERIZER
+from snake_raster import CODE_APPLE, CODE_SNAKE
+
+# --- Action tables (same encoding as SnakeEnv) ---
+# 0: UP, 1: DOWN, 2: LEFT, 3: RIGHT
+ACTION_DX = np.array([0, 0, -1, 1], dtype=np.int64)
+ACTION_DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+OPPOSITE_ACTIONS = np.array([1, 0, 3, 2], dtype=np.int64)
+
+
+# --- The Batched Snake Environment ---
+class SnakeVecEnv(VecEnv):
+    """
+    Vectorized Snake: N independent boards simulated with NumPy array operations.
+
+    Follows the same rules, observation and rewards as SnakeEnv:
+        • + (10 + len(snake) + number_of_traps) when eating an apple.
+        • -10 when hitting a trap (and the snake's length is cut to half).
+        • -0.1 per normal move.
+        • -100 if the snake collides with the wall or itself (episode termination).
+
+    Board state is held as stacked arrays:
+        body       (N, cells+1) ring buffer of flattened cell indices, head at head_ptr
+        snake_mask (N, cells)   occupancy of the snake body
+        trap_mask  (N, cells)   occupancy of the traps
+        apple      (N,)         flattened apple cell (-1 once the board is full)
+    Finished boards are reset automatically; the last observation of the episode is
+    returned in info["terminal_observation"] as Stable-Baselines3 expects.
+    If a board fills up completely so that no apple can be placed, its episode ends.
+    """
+
+    def __init__(self, num_envs, grid_width=GRID_WIDTH, grid_height=GRID_HEIGHT,
+                 trap_interval=10, seed=None):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.n_cells = grid_width * grid_height
+        self.capacity = self.n_cells + 1
+        self.trap_interval = trap_interval
+        self.render_mode = "rgb_array"  # Frames are rasterized with NumPy, see render().
+
+        n = num_envs
+        self._env_idx = np.arange(n)
+        self._rng = np.random.default_rng(seed)
+
+        self.body = np.zeros((n, self.capacity), dtype=np.int32)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.snake_mask = np.zeros((n, self.n_cells), dtype=bool)
+        self.trap_mask = np.zeros((n, self.n_cells), dtype=bool)
+        self.trap_count = np.zeros(n, dtype=np.int64)
+        self.apple = np.zeros(n, dtype=np.int64)
+        self.apple_color = np.zeros(n, dtype=np.int8)
+        self.direction = np.full(n, 3, dtype=np.int64)
+        self.steps_since_last_trap = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.float64)
+        self._actions = np.zeros(n, dtype=np.int64)
+
+        observation_space = spaces.Box(low=0, high=3,
+                                       shape=(grid_height, grid_width),
+                                       dtype=np.int8)
+        super(SnakeVecEnv, self).__init__(n, observation_space, spaces.Discrete(4))
+
+    # --- Board helpers ---
+
+    def _sample_free(self, idx, blocked):
+        """
+        Pick one uniformly random free cell per board.
+        Returns (cells, full) where full marks boards without any free cell.
+        """
+        keys = self._rng.random((len(idx), self.n_cells))
+        keys[blocked] = -1.0
+        cells = keys.argmax(axis=1)
+        full = ~(keys.max(axis=1) >= 0.0)
+        return cells, full
+
+    def _reset_boards(self, idx):
+        """Reset the selected boards to the starting position of SnakeEnv.reset()."""
+        if len(idx) == 0:
+            return
+        mid_x, mid_y = self.grid_width // 2, self.grid_height // 2
+        start = mid_y * self.grid_width + np.array([mid_x, mid_x - 1, mid_x - 2])
+
+        self.body[idx, :3] = start
+        self.head_ptr[idx] = 0
+        self.length[idx] = 3
+        self.snake_mask[idx] = False
+        self.snake_mask[idx[:, None], start[None, :]] = True
+        self.trap_mask[idx] = False
+        self.trap_count[idx] = 0
+        self.direction[idx] = 3
+        self.steps_since_last_trap[idx] = 0
+        self.score[idx] = 0
+
+        cells, _ = self._sample_free(idx, self.snake_mask[idx])
+        self.apple[idx] = cells
+        self.apple_color[idx] = self._rng.integers(0, len(APPLE_COLORS), size=len(idx))
+
+    def _get_observations(self, idx=None):
+        """Return the (n, GRID_HEIGHT, GRID_WIDTH) int8 grids for the selected boards."""
+        if idx is None:
+            idx = self._env_idx
+        obs = self.snake_mask[idx].astype(np.int8)
+        apples = self.apple[idx]
+        rows = np.flatnonzero(apples >= 0)  # A full board has no apple (-1).
+        obs[rows, apples[rows]] = 2
+        obs[self.trap_mask[idx]] = 3
+        return obs.reshape(len(idx), self.grid_height, self.grid_width)
+
+    def cell_codes(self):
+        """Return the (n, GRID_HEIGHT, GRID_WIDTH) cell codes of every board for the Rasterizer."""
+        codes = self._get_observations()
+        flat = codes.reshape(self.num_envs, self.n_cells)
+        flat[self.snake_mask] = CODE_SNAKE
+        rows = np.flatnonzero(flat[self._env_idx, self.apple] == 2)  # Apples not covered by the snake.
+        flat[rows, self.apple[rows]] = CODE_APPLE + self.apple_color[rows]
+        return codes
+
+    # --- VecEnv API ---
+
+    def reset(self):
+        """Reset every board and return the stacked initial observations."""
+        if self._seeds[0] is not None:
+            self._rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        self._reset_boards(self._env_idx)
+        return self._get_observations()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        ar = self._env_idx
+        cap = self.capacity
+
+        # Prevent reversal if the snake has length > 1.
+        actions = self._actions
+        reverse = (self.length > 1) & (actions == OPPOSITE_ACTIONS[self.direction])
+        actions = np.where(reverse, self.direction, actions)
+        self.direction = actions
+
+        head = self.body[ar, self.head_ptr]
+        new_x = head % self.grid_width + ACTION_DX[actions]
+        new_y = head // self.grid_width + ACTION_DY[actions]
+
+        # Wall and self collisions end the episode.
+        wall = (new_x < 0) | (new_x >= self.grid_width) | (new_y < 0) | (new_y >= self.grid_height)
+        new_head = np.where(wall, 0, new_y * self.grid_width + new_x)
+        dead = wall | self.snake_mask[ar, new_head]
+        alive = ~dead
+
+        rewards = np.where(dead, -100.0, -0.1).astype(np.float32)
+        ate = alive & (new_head == self.apple)
+        trapped = alive & ~ate & self.trap_mask[ar, new_head]
+        moved = alive & ~ate & ~trapped
+
+        # Every surviving snake gets its new head.
+        live = ar[alive]
+        self.head_ptr[live] = (self.head_ptr[live] - 1) % cap
+        self.body[live, self.head_ptr[live]] = new_head[live]
+        self.snake_mask[live, new_head[live]] = True
+        self.length[live] += 1
+
+        # Normal move: release the tail.
+        mv = ar[moved]
+        tail = self.body[mv, (self.head_ptr[mv] + self.length[mv] - 1) % cap]
+        self.snake_mask[mv, tail] = False
+        self.length[mv] -= 1
+
+        # Hit a trap: cut the snake to half (minimum length 1).
+        tr = ar[trapped]
+        if len(tr):
+            new_length = np.maximum(1, self.length[tr] // 2)
+            k = np.arange(cap)
+            cut = (k[None, :] >= new_length[:, None]) & (k[None, :] < self.length[tr][:, None])
+            rows, ks = np.nonzero(cut)
+            boards = tr[rows]
+            cells = self.body[boards, (self.head_ptr[boards] + ks) % cap]
+            self.snake_mask[boards, cells] = False
+            self.length[tr] = new_length
+            rewards[tr] = -10.0
+
+        # Apple eaten: reward and place a new apple.
+        board_full = np.zeros(self.num_envs, dtype=bool)
+        ea = ar[ate]
+        if len(ea):
+            apple_reward = 10 + self.length[ea] + self.trap_count[ea]
+            rewards[ea] = apple_reward
+            self.score[ea] += apple_reward
+            cells, full = self._sample_free(ea, self.snake_mask[ea] | self.trap_mask[ea])
+            self.apple[ea] = np.where(full, -1, cells)
+            self.apple_color[ea] = self._rng.integers(0, len(APPLE_COLORS), size=len(ea))
+            board_full[ea[full]] = True
+
+        # Update trap counters and add a trap where the interval is reached.
+        self.steps_since_last_trap[live] += 1
+        spawn = ar[alive & (self.steps_since_last_trap >= self.trap_interval)]
+        if len(spawn):
+            blocked = self.snake_mask[spawn] | self.trap_mask[spawn]
+            blocked[np.arange(len(spawn)), self.apple[spawn]] = True
+            cells, full = self._sample_free(spawn, blocked)
+            placed = spawn[~full]
+            self.trap_mask[placed, cells[~full]] = True
+            self.trap_count[placed] += 1
+            self.steps_since_last_trap[spawn] = 0
+
+        dones = dead | board_full
+        obs = self._get_observations()
+        infos = [{} for _ in range(self.num_envs)]
+        finished = ar[dones]
+        for i in finished:
+            infos[i]["terminal_observation"] = obs[i].copy()
+            infos[i]["score"] = float(self.score[i])
+            infos[i]["TimeLimit.truncated"] = False
+            if board_full[i]:
+                infos[i]["board_full"] = True
+        if len(finished):
+            self._reset_boards(finished)
+            obs[finished] = self._get_observations(finished)
+        return obs, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def get_images(self):
+        """Return the RGB frame of every board (as SnakeEnv.render('rgb_array') draws it)."""
+        return list(RASTERIZER.frames(self.cell_codes()))
+
+    def render(self, mode=None):
+        """'rgb_array' (default): one frame with all boards tiled in rows and columns."""
+        if mode in (None, "rgb_array"):
+            return RASTERIZER.tiled(self.cell_codes())
+        return super(SnakeVecEnv, self).render(mode)
+
+    def get_attr(self, attr_name, indices=None):
+        """Per-board arrays are sliced per board; other attributes are shared."""
+        value = getattr(self, attr_name)
+        indices = self._get_indices(indices)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in indices]
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """Attributes are shared by all boards, so they can only be set for all of them."""
+        if sorted(self._get_indices(indices)) != list(range(self.num_envs)):
+            raise ValueError("SnakeVecEnv can only set {!r} for all boards at once".format(attr_name))
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Methods act on all boards: call once and give every index the result."""
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+
+# --- Throughput check ---
+#
+# Steps N boards with random actions and reports env steps per second.
+#
+if __name__ == "__main__":
+    num_envs = 1024
+    num_steps = 1000
+    env = SnakeVecEnv(num_envs, seed=0)
+    env.reset()
+    rng = np.random.default_rng(0)
+    episodes = 0
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        obs, rewards, dones, infos = env.step(rng.integers(0, 4, size=num_envs))
+        episodes += int(dones.sum())
+    elapsed = time.perf_counter() - start
+    print("Boards:", num_envs, "Episodes finished:", episodes)
+    print("Env steps/sec: {:.0f}".format(num_envs * num_steps / elapsed))